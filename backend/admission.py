@@ -0,0 +1,158 @@
+"""
+Admission control for the API.
+
+Each client (its X-API-Key header if the key is listed in API_KEYS,
+otherwise its address) gets two token buckets: a generous one for
+ordinary requests and a small one for the endpoints that call the LLM.
+A request that finds its bucket empty is rejected with 429 and a
+Retry-After header. LLM-backed requests are additionally shed with 503
+while the worker already has LLM_MAX_QUEUE_DEPTH calls queued or
+running, so a burst of clicks can't pile up paid calls that nobody will
+wait for.
+
+Budgets are per worker process, so configured limits are split across
+WORKERS the same way the global LLM budget is.
+"""
+import hashlib
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from config import settings
+from llm_service import llm_service
+
+# (method, path) of requests that trigger LLM calls
+LLM_ROUTES = [
+    ("POST", re.compile(r"^/api/emails/\d+/process$")),
+    ("POST", re.compile(r"^/api/chat$")),
+]
+
+# Buckets kept per tier; least recently seen clients are forgotten first
+MAX_CLIENTS = 10000
+SHED_RETRY_AFTER = 5
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int, burst: int):
+        self.rate = per_minute / 60
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Spend a token; return 0, or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Tier:
+    def __init__(self, per_minute: int, burst: int):
+        if per_minute > 0:
+            per_minute = max(1, per_minute // max(1, settings.workers))
+            burst = max(1, burst // max(1, settings.workers))
+        self.per_minute = per_minute
+        self.burst = burst
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.admitted = 0
+        self.throttled = 0
+        self.shed = 0
+
+    def take(self, client: str) -> float:
+        if self.per_minute <= 0:
+            return 0.0
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.per_minute, self.burst)
+            while len(self.buckets) > MAX_CLIENTS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+        return bucket.take()
+
+    def as_dict(self) -> Dict:
+        return {
+            "requests_per_minute": self.per_minute,
+            "burst": self.burst,
+            "clients": len(self.buckets),
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "shed": self.shed,
+        }
+
+
+class AdmissionController:
+    def __init__(self):
+        self.tiers = {
+            "read": Tier(settings.client_read_requests_per_minute, settings.client_read_burst),
+            "llm": Tier(settings.client_llm_requests_per_minute, settings.client_llm_burst),
+        }
+        self.max_queue_depth = settings.llm_max_queue_depth
+
+    def admit(self, client: str, tier_name: str) -> Tuple[Optional[int], float]:
+        """Return (None, 0) to admit, else (status code, retry after seconds)"""
+        tier = self.tiers[tier_name]
+        # Shed before charging the bucket so a client isn't billed for it
+        if tier_name == "llm" and self.max_queue_depth > 0 and llm_service.queue_depth >= self.max_queue_depth:
+            tier.shed += 1
+            return 503, SHED_RETRY_AFTER
+        retry_after = tier.take(client)
+        if retry_after:
+            tier.throttled += 1
+            return 429, retry_after
+        tier.admitted += 1
+        return None, 0.0
+
+    def stats_report(self) -> Dict:
+        return {
+            "llm_queue_depth": llm_service.queue_depth,
+            "llm_max_queue_depth": self.max_queue_depth,
+            "tiers": {name: tier.as_dict() for name, tier in self.tiers.items()},
+        }
+
+
+controller = AdmissionController()
+
+# Unknown keys must not buy a fresh bucket, so only these are trusted
+KNOWN_API_KEYS = {key.strip() for key in settings.api_keys.split(",") if key.strip()}
+
+
+def client_key(request: Request) -> str:
+    api_key = request.headers.get("x-api-key")
+    if api_key in KNOWN_API_KEYS:
+        # Don't keep raw keys in memory longer than the request
+        return "key:" + hashlib.sha1(api_key.encode("utf-8")).hexdigest()
+    return "addr:" + (request.client.host if request.client else "unknown")
+
+
+def request_tier(request: Request) -> str:
+    for method, pattern in LLM_ROUTES:
+        if request.method == method and pattern.match(request.url.path):
+            return "llm"
+    return "read"
+
+
+async def admission_middleware(request: Request, call_next):
+    # Preflight requests are answered by the CORS middleware and cost nothing
+    if not request.url.path.startswith("/api/") or request.method == "OPTIONS":
+        return await call_next(request)
+
+    status, retry_after = controller.admit(client_key(request), request_tier(request))
+    if status is None:
+        return await call_next(request)
+
+    detail = "Too many requests" if status == 429 else "LLM is busy, try again shortly"
+    return JSONResponse(
+        status_code=status,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
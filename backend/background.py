@@ -0,0 +1,78 @@
+"""
+Periodic background jobs.
+
+Every worker runs the same loops, but each job is guarded by a
+database lease so only one worker executes it per interval. The lease
+is renewed for as long as a run takes; if the worker dies it expires
+within LEASE_TTL seconds and another worker takes over. The time
+of the last completed run is kept on the lease, so restarting the
+workers doesn't run a job again before its interval is up.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, Dict, List
+
+from database import acquire_lease, release_lease, record_lease_run, seconds_until_due
+
+# Identifies this process as a lease holder
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Short, and renewed while a job runs, so a long run keeps its lease and
+# a crashed worker's lease frees up quickly
+LEASE_TTL = 60
+
+_jobs: Dict[str, Dict] = {}
+_tasks: List[asyncio.Task] = []
+
+
+def register_job(name: str, interval: float, func: Callable[[], Awaitable[None]]):
+    """Register an async job to run every interval seconds in one worker"""
+    _jobs[name] = {"interval": interval, "func": func}
+
+
+async def _keep_lease(name: str):
+    """Renew a job's lease while it runs, however long that takes"""
+    while True:
+        await asyncio.sleep(LEASE_TTL / 3)
+        if not acquire_lease(name, WORKER_ID, LEASE_TTL):
+            print(f"Background job {name} lost its lease while running")
+
+
+async def _run_job(name: str, interval: float, func):
+    while True:
+        # Workers without the lease check back soon, so a crashed holder
+        # is replaced within about LEASE_TTL rather than an interval
+        delay = min(interval, LEASE_TTL)
+        try:
+            if acquire_lease(name, WORKER_ID, LEASE_TTL):
+                due_in = seconds_until_due(name, interval)
+                if due_in <= 0:
+                    heartbeat = asyncio.create_task(_keep_lease(name))
+                    try:
+                        await func()
+                    finally:
+                        heartbeat.cancel()
+                    record_lease_run(name)
+                    delay = interval
+                else:
+                    delay = min(interval, due_in)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in background job {name}: {str(e)}")
+        await asyncio.sleep(delay)
+
+
+async def start_jobs():
+    for name, job in _jobs.items():
+        _tasks.append(asyncio.create_task(_run_job(name, job["interval"], job["func"])))
+
+
+async def stop_jobs():
+    for task in _tasks:
+        task.cancel()
+    _tasks.clear()
+    for name in _jobs:
+        release_lease(name, WORKER_ID)
@@ -0,0 +1,77 @@
+"""
+Benchmark for the /api/emails serialization path.
+
+Compares the ORM + Pydantic + stdlib json path with the SQL projection +
+orjson path used by the list endpoints, on a throwaway database.
+"""
+import os
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import json
+from typing import List
+
+from pydantic import TypeAdapter
+
+from database import SessionLocal, init_db, Email
+from models import EmailListItem
+from serialization import dumps, fetch_dicts, select_for, orjson
+
+EMAIL_COUNT = 1000
+ROUNDS = 20
+
+
+def seed(db):
+    for i in range(EMAIL_COUNT):
+        db.add(Email(
+            sender=f"sender{i}@example.com",
+            sender_name=f"Sender {i}",
+            recipient="you@company.com",
+            subject=f"Weekly report #{i}",
+            body="Hi team,\n\nPlease find this week's numbers below.\n" * 5,
+            category="Work",
+            priority="Medium",
+            action_items="[]"
+        ))
+    db.commit()
+
+
+def orm_pydantic_json(db):
+    adapter = TypeAdapter(List[EmailListItem])
+    emails = db.query(Email).limit(EMAIL_COUNT).all()
+    return json.dumps(adapter.dump_python(adapter.validate_python(emails), mode="json")).encode("utf-8")
+
+
+def projection_fast_json(db):
+    return dumps(fetch_dicts(db, select_for(Email, EmailListItem).limit(EMAIL_COUNT)))
+
+
+def timed(fn, db):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        db.expunge_all()
+        start = time.perf_counter()
+        fn(db)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    init_db()
+    db = SessionLocal()
+    seed(db)
+
+    assert json.loads(orm_pydantic_json(db)) == json.loads(projection_fast_json(db))
+
+    before = timed(orm_pydantic_json, db)
+    after = timed(projection_fast_json, db)
+    encoder = "orjson" if orjson is not None else "stdlib json"
+    print(f"Serializing {EMAIL_COUNT} emails (best of {ROUNDS}):")
+    print(f"  {'ORM + Pydantic + json':32} {before:8.2f} ms")
+    print(f"  {'SQL projection + ' + encoder:32} {after:8.2f} ms")
+    print(f"  Speedup: {before / after:.1f}x")
+    db.close()
@@ -1,33 +1,52 @@
 """
 Script to remove duplicate emails from the database
 """
-from database import SessionLocal, Email, Prompt, Draft
+from sqlalchemy import func
+
+from database import SessionLocal, Email, EmailBody, Draft
+from threads import refresh_thread_counts
+from similarity import unindex_email
+
+
+def remove_duplicate_emails(db) -> int:
+    """Delete emails with the same sender, subject and body as an earlier
+    one. Emails with different Message-IDs are never duplicates, e.g. a
+    daily digest that repeats itself."""
+    groups = db.query(Email.sender, Email.subject, EmailBody.size).outerjoin(
+        EmailBody, EmailBody.email_id == Email.id
+    ).group_by(Email.sender, Email.subject, EmailBody.size).having(func.count(Email.id) > 1).all()
+
+    removed = 0
+    for sender, subject, size in groups:
+        emails = db.query(Email).outerjoin(EmailBody, EmailBody.email_id == Email.id).filter(
+            Email.sender == sender, Email.subject == subject, EmailBody.size == size
+        ).order_by(Email.id).all()
+        seen = set()
+        duplicates = []
+        for email in emails:
+            key = (email.message_id, email.body)
+            if key in seen:
+                duplicates.append(email)
+            else:
+                seen.add(key)
+        for email in duplicates:
+            for draft in db.query(Draft).filter(Draft.email_id == email.id):
+                db.delete(draft)
+            db.delete(email)
+            unindex_email(email.id)
+        refresh_thread_counts(db, [email.thread_id for email in duplicates])
+        db.commit()
+        removed += len(duplicates)
+    return removed
+
 
 def cleanup_duplicates():
     db = SessionLocal()
     
-    # Get all emails
-    emails = db.query(Email).all()
-    print(f"Total emails before cleanup: {len(emails)}")
-    
-    # Track unique emails by subject + sender + body
-    seen = set()
-    duplicates = []
-    
-    for email in emails:
-        key = (email.subject, email.sender, email.body)
-        if key in seen:
-            duplicates.append(email)
-        else:
-            seen.add(key)
-    
-    # Delete duplicates
-    for email in duplicates:
-        db.delete(email)
-    
-    db.commit()
-    print(f"Removed {len(duplicates)} duplicate emails")
-    print(f"Total emails after cleanup: {len(emails) - len(duplicates)}")
+    print(f"Total emails before cleanup: {db.query(Email).count()}")
+    removed = remove_duplicate_emails(db)
+    print(f"Removed {removed} duplicate emails")
+    print(f"Total emails after cleanup: {db.query(Email).count()}")
     
     db.close()
 
@@ -0,0 +1,60 @@
+"""
+Script to train a compression dictionary on the stored emails and
+recompress all bodies with it
+"""
+from database import (
+    SessionLocal, init_db, Email, EmailBody, CompressionDict, reset_compression_cache
+)
+from compression import train_dictionary
+
+SAMPLE_SIZE = 2000
+BATCH_SIZE = 500
+
+
+def compress_bodies():
+    db = SessionLocal()
+
+    # Train on the most recent emails
+    samples = [
+        email.body for email in
+        db.query(Email).order_by(Email.id.desc()).limit(SAMPLE_SIZE)
+    ]
+    zdict = train_dictionary(samples)
+    if not zdict:
+        print("Not enough repeated content to train a dictionary")
+        db.close()
+        return
+
+    db.add(CompressionDict(data=zdict, sample_count=len(samples)))
+    db.commit()
+    reset_compression_cache()
+    print(f"Trained {len(zdict)} byte dictionary on {len(samples)} emails")
+
+    stored_before = 0
+    stored_after = 0
+    last_id = 0
+    while True:
+        emails = db.query(Email).filter(Email.id > last_id).order_by(Email.id).limit(BATCH_SIZE).all()
+        if not emails:
+            break
+        for email in emails:
+            record = email.body_record
+            stored_before += len(record.data or b"") if record else 0
+            email.body = email.body
+            stored_after += len(email.body_record.data or b"")
+            last_id = email.id
+        db.commit()
+        db.expunge_all()
+
+    raw_size = sum(size or 0 for (size,) in db.query(EmailBody.size))
+    print(f"Uncompressed bodies: {raw_size} bytes")
+    print(f"Stored before: {stored_before} bytes, after: {stored_after} bytes")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Compressing email bodies...")
+    compress_bodies()
+    print("\n✨ Compression complete!")
@@ -0,0 +1,95 @@
+"""
+Email body compression helpers.
+
+Bodies are stored zlib-compressed, optionally primed with a preset
+dictionary trained on the mailbox so that short emails (signatures,
+greetings, boilerplate) still compress well.
+"""
+import zlib
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+# Bodies smaller than this are stored as-is; zlib overhead isn't worth it
+MIN_COMPRESS_SIZE = 128
+# zlib can only use the last 32 KB of a preset dictionary
+MAX_DICT_SIZE = 32 * 1024
+COMPRESSION_LEVEL = 6
+
+CODEC_RAW = "raw"
+CODEC_ZLIB = "zlib"
+CODEC_ZLIB_DICT = "zlib-dict"
+
+SNIPPET_LENGTH = 200
+
+
+def make_snippet(body: Optional[str]) -> str:
+    """Short single-line preview used by list views"""
+    return " ".join((body or "").split())[:SNIPPET_LENGTH]
+
+
+def compress_body(body: Optional[str], zdict: Optional[bytes] = None) -> Tuple[str, bytes]:
+    """Compress a body, returning (codec, data)"""
+    raw = (body or "").encode("utf-8")
+    if len(raw) < MIN_COMPRESS_SIZE:
+        return CODEC_RAW, raw
+
+    if zdict:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict)
+        codec = CODEC_ZLIB_DICT
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+        codec = CODEC_ZLIB
+    data = compressor.compress(raw) + compressor.flush()
+
+    if len(data) >= len(raw):
+        return CODEC_RAW, raw
+    return codec, data
+
+
+def decompress_body(codec: str, data: Optional[bytes], zdict: Optional[bytes] = None) -> str:
+    """Inverse of compress_body"""
+    if data is None:
+        return ""
+    if codec == CODEC_RAW:
+        return data.decode("utf-8")
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    if codec == CODEC_ZLIB_DICT:
+        if zdict is None:
+            raise ValueError("Compression dictionary missing for zlib-dict body")
+        decompressor = zlib.decompressobj(zdict=zdict)
+        return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+    raise ValueError(f"Unknown body codec: {codec}")
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICT_SIZE) -> bytes:
+    """Build a zlib preset dictionary from sample bodies.
+
+    Lines and three-word phrases that recur across emails (greetings,
+    sign-offs, footers) are ranked by how many bytes they would save. The
+    best ones go last, since zlib matches closer to the end of the
+    dictionary more cheaply.
+    """
+    lines = Counter()
+    phrases = Counter()
+    for body in samples:
+        # Count each line/phrase once per email so one long repetitive
+        # email doesn't dominate the dictionary
+        body_lines = [line.strip() for line in (body or "").splitlines()]
+        lines.update(set(line for line in body_lines if len(line) >= 4))
+        words = (body or "").split()
+        phrases.update(set(" ".join(words[i:i + 3]) for i in range(len(words) - 2)))
+
+    chosen = []
+    total = 0
+    candidates = [(line + "\n", count) for line, count in lines.most_common() if count >= 2]
+    candidates += [(phrase + " ", count) for phrase, count in phrases.most_common() if count >= 2]
+    candidates.sort(key=lambda item: item[1] * len(item[0]), reverse=True)
+    for fragment, _ in candidates:
+        encoded = fragment.encode("utf-8")
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+
+    return b"".join(reversed(chosen))
@@ -9,15 +9,82 @@ ENV_FILE = BASE_DIR / ".env"
 
 
 class Settings(BaseSettings):
-    gemini_api_key: str
-    gemini_model: str = "gemini-1.5-flash"
+    # Only needed once an LLM call is made; read-only replicas and tests
+    # can run without it
+    gemini_api_key: Optional[str] = None
+    gemini_model: str = "gemini-1.5-flash"  # drafts and chat
+    # Categorization, task extraction, summaries; unset = GEMINI_MODEL
+    gemini_fast_model: Optional[str] = None
+    llm_fallback_model: Optional[str] = None  # tried after both models fail
+    llm_latency_slo_seconds: float = 30.0  # slower calls fail over to the next model
+    # "gemini", or "local" for the offline rule-based stand-in
+    llm_provider: str = "gemini"
     database_url: str = "sqlite:///./email_agent.db"
     host: str = "0.0.0.0"
     port: int = 8000
-    
+    # "local" fans events out within one process; "database" relays them
+    # through the events table so every worker sees them
+    event_broker: str = "local"
+    event_queue_size: int = 100
+    # Number of server processes; set EVENT_BROKER=database when > 1
+    workers: int = 1
+    # Run init_db() in the startup event; the multi-worker launcher runs it
+    # once up front and turns this off for the workers
+    init_db_on_startup: bool = True
+    # Total LLM calls per minute across all workers (0 = unlimited)
+    llm_requests_per_minute: int = 0
+    # Seconds between background passes that pre-generate drafts for
+    # high-priority unread emails (0 = disabled)
+    speculative_draft_interval: int = 60
+    # Draft versions kept per email; older unsent versions are pruned
+    draft_versions_kept: int = 3
+    # Append-only vector file backing similar-email lookup
+    vector_index_path: str = "./email_vectors.bin"
+    # Reuse the draft of an email at least this similar (cosine); >1 disables
+    draft_reuse_threshold: float = 0.9
+    # Comma-separated origins allowed to call the API from a browser
+    cors_origins: str = "http://localhost:3000"
+    # Comma-separated API keys that get their own rate-limit buckets; any
+    # other X-API-Key is ignored and the client address is used instead
+    api_keys: str = ""
+    # Per-client token buckets, keyed by a known X-API-Key or the client
+    # address, split across workers (0 = unlimited). LLM-backed endpoints
+    # (process, chat) have their own, much smaller budget.
+    client_read_requests_per_minute: int = 600
+    client_read_burst: int = 100
+    client_llm_requests_per_minute: int = 10
+    client_llm_burst: int = 3
+    # LLM-backed requests are shed with 503 while this many LLM calls are
+    # queued or running in the worker (0 = never shed)
+    llm_max_queue_depth: int = 8
+    # Seconds between maintenance passes that archive, prune, vacuum and
+    # analyze the database (0 = disabled)
+    maintenance_interval: int = 86400
+    # Emails received longer ago than this move to archived_emails, which
+    # the API doesn't read back; opt-in (0 = never)
+    archive_after_days: int = 0
+    # Unsent drafts older than this are deleted unless current (0 = never)
+    draft_retention_days: int = 30
+
     class Config:
         env_file = str(ENV_FILE)
         case_sensitive = False
 
 
 settings = Settings()
+
+
+def prepare_worker_settings(workers: int):
+    """Settings for the processes a multi-worker launcher starts.
+
+    The launcher creates the schema itself, events must go through the
+    database so clients on every worker receive them, and per-worker
+    budgets are split by the actual worker count. Set in both the
+    environment (spawned workers) and settings (forked workers).
+    """
+    if settings.event_broker != "database":
+        print("Multiple workers: using EVENT_BROKER=database so every worker receives events")
+    overrides = {"init_db_on_startup": False, "event_broker": "database", "workers": workers}
+    for name, value in overrides.items():
+        os.environ[name.upper()] = str(value).lower()
+        setattr(settings, name, value)
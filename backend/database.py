@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy import (
+    create_engine, Column, Integer, String, Text, DateTime, Boolean, LargeBinary, ForeignKey, Index,
+    inspect, text, select, event, update
+)
+from sqlalchemy.orm import Session, declarative_base, sessionmaker, relationship, deferred
+from datetime import datetime, timedelta
 from config import settings
+from compression import compress_body, decompress_body, make_snippet
 
 # Create SQLite engine
 engine = create_engine(
@@ -10,6 +13,22 @@ engine = create_engine(
     connect_args={"check_same_thread": False}
 )
 
+
+
+@event.listens_for(engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    """WAL lets several worker processes read while one writes"""
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    # Only takes effect on a new database; the maintenance job converts
+    # existing ones so freed pages can be returned incrementally
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -23,7 +42,10 @@ class Email(Base):
     sender_name = Column(String)
     recipient = Column(String)
     subject = Column(String, index=True)
-    body = Column(Text)
+    # Bodies live compressed in email_bodies; the original column only holds
+    # rows written before that and is emptied by init_db()
+    legacy_body = deferred(Column("body", Text))
+    snippet = Column(String)
     category = Column(String, index=True, default="Uncategorized")
     priority = Column(String, default="Medium")
     received_at = Column(DateTime, default=datetime.utcnow)
@@ -31,6 +53,65 @@ class Email(Base):
     has_action_items = Column(Boolean, default=False)
     action_items = Column(Text)  # JSON string
     sentiment = Column(String)
+    message_id = Column(String, index=True)
+    in_reply_to = Column(String)
+    references = Column(Text)  # space separated Message-IDs
+    thread_id = Column(Integer, index=True)
+    current_draft_id = Column(Integer)  # latest non-speculative draft version
+    is_indexed = Column(Boolean, default=False, index=True)  # in the similarity index
+    
+    body_record = relationship("EmailBody", uselist=False, cascade="all, delete-orphan")
+    
+    @property
+    def body(self):
+        """Decompressed body, loaded from email_bodies on first access"""
+        record = self.body_record
+        if record is None:
+            return self.legacy_body
+        return decompress_body(record.codec, record.data, get_compression_dictionary(record.dict_id))
+    
+    @body.setter
+    def body(self, value):
+        dict_id, zdict = get_active_compression_dictionary()
+        codec, data = compress_body(value, zdict)
+        if self.body_record is None:
+            self.body_record = EmailBody()
+        self.body_record.codec = codec
+        self.body_record.dict_id = dict_id if codec == "zlib-dict" else None
+        self.body_record.size = len((value or "").encode("utf-8"))
+        self.body_record.data = data
+        self.snippet = make_snippet(value)
+
+
+class EmailBody(Base):
+    __tablename__ = "email_bodies"
+    
+    email_id = Column(Integer, ForeignKey("emails.id"), primary_key=True)
+    codec = Column(String, default="raw")  # raw, zlib, zlib-dict
+    dict_id = Column(Integer)  # compression_dicts.id for zlib-dict
+    size = Column(Integer)  # uncompressed size in bytes
+    data = Column(LargeBinary)
+
+
+class CompressionDict(Base):
+    __tablename__ = "compression_dicts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    data = Column(LargeBinary)
+    sample_count = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Thread(Base):
+    __tablename__ = "threads"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    subject_key = Column(String, index=True)  # normalized subject
+    summary = Column(Text)  # rolling summary of earlier messages
+    summarized_through_id = Column(Integer, default=0)  # last email folded into summary
+    message_count = Column(Integer, default=0)
+    last_message_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
     
 
 class Prompt(Base):
@@ -47,6 +128,9 @@ class Prompt(Base):
 
 class Draft(Base):
     __tablename__ = "drafts"
+    __table_args__ = (
+        Index("ix_drafts_email_id_created_at", "email_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     email_id = Column(Integer, index=True)
@@ -55,6 +139,169 @@ class Draft(Base):
     tone = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_sent = Column(Boolean, default=False)
+    # Pre-generated in the background before the user asked for it
+    is_speculative = Column(Boolean, default=False)
+    version = Column(Integer)  # per-email version, assigned when a draft becomes current
+    source_hash = Column(String)  # email + prompt fingerprint it was generated from
+
+
+class ArchivedEmail(Base):
+    """Email moved out of the hot tables by the maintenance job"""
+    __tablename__ = "archived_emails"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    email_id = Column(Integer, index=True)  # original emails.id
+    sender = Column(String, index=True)
+    subject = Column(String)
+    category = Column(String)
+    received_at = Column(DateTime, index=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    # JSON of the email row, its body and drafts, compressed like bodies
+    codec = Column(String)
+    dict_id = Column(Integer)
+    data = Column(LargeBinary)
+
+
+class DataVersion(Base):
+    """Per-resource change counter, bumped on every write (used for ETags)"""
+    __tablename__ = "data_versions"
+    
+    name = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Event(Base):
+    """Outbox of inbox events, relayed to WebSocket clients by every worker"""
+    __tablename__ = "events"
+    # Never reuse ids after pruning; workers track the last id they saw
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String)
+    payload = Column(Text)  # JSON string
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class Lease(Base):
+    """Named lease so a background job runs in only one worker at a time"""
+    __tablename__ = "leases"
+    
+    name = Column(String, primary_key=True)
+    holder = Column(String)
+    expires_at = Column(DateTime)
+    last_run_at = Column(DateTime)  # last completed run, kept across restarts
+
+
+# Which data version a write to each table bumps
+VERSIONED_TABLES = {
+    "emails": "emails",
+    "email_bodies": "emails",
+    "threads": "threads",
+    "prompts": "prompts",
+    "drafts": "drafts",
+}
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_data_versions(session, flush_context):
+    changed = set()
+    for obj in list(session.new) + list(session.deleted):
+        changed.add(VERSIONED_TABLES.get(obj.__tablename__))
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            changed.add(VERSIONED_TABLES.get(obj.__tablename__))
+    changed.discard(None)
+    if changed:
+        session.connection().execute(
+            update(DataVersion)
+            .where(DataVersion.name.in_(changed))
+            .values(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+        )
+
+
+def get_data_versions(names):
+    """Return {name: (version, updated_at)} for the given resources"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(DataVersion.name, DataVersion.version, DataVersion.updated_at)
+            .where(DataVersion.name.in_(names))
+        ).all()
+    return {row.name: (row.version, row.updated_at) for row in rows}
+
+
+def acquire_lease(name, holder, ttl_seconds):
+    """Take or renew a lease; returns True if holder now owns it"""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT OR IGNORE INTO leases (name, holder, expires_at) VALUES (:name, NULL, :now)"),
+            {"name": name, "now": now}
+        )
+        result = conn.execute(
+            update(Lease)
+            .where(Lease.name == name)
+            .where((Lease.holder == holder) | (Lease.holder.is_(None)) | (Lease.expires_at < now))
+            .values(holder=holder, expires_at=now + timedelta(seconds=ttl_seconds))
+        )
+    return result.rowcount == 1
+
+
+def release_lease(name, holder):
+    with engine.begin() as conn:
+        conn.execute(
+            update(Lease)
+            .where(Lease.name == name, Lease.holder == holder)
+            .values(holder=None)
+        )
+
+
+def record_lease_run(name):
+    with engine.begin() as conn:
+        conn.execute(update(Lease).where(Lease.name == name).values(last_run_at=datetime.utcnow()))
+
+
+def seconds_until_due(name, interval):
+    """Seconds until a job last completed under this lease is due again (<= 0 if due)"""
+    with engine.connect() as conn:
+        last_run_at = conn.execute(select(Lease.last_run_at).where(Lease.name == name)).scalar()
+    if last_run_at is None:
+        return 0
+    return interval - (datetime.utcnow() - last_run_at).total_seconds()
+
+
+# Dictionaries are immutable once written, so they are cached per process
+_dictionary_cache = {}
+_active_dictionary = None
+
+
+def get_compression_dictionary(dict_id):
+    if dict_id is None:
+        return None
+    if dict_id not in _dictionary_cache:
+        with engine.connect() as conn:
+            _dictionary_cache[dict_id] = conn.execute(
+                select(CompressionDict.data).where(CompressionDict.id == dict_id)
+            ).scalar()
+    return _dictionary_cache[dict_id]
+
+
+def get_active_compression_dictionary():
+    """Return (id, data) of the newest dictionary, or (None, None)"""
+    global _active_dictionary
+    if _active_dictionary is None:
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(CompressionDict.id, CompressionDict.data).order_by(CompressionDict.id.desc()).limit(1)
+            ).first()
+        _active_dictionary = (row.id, row.data) if row else (None, None)
+    return _active_dictionary
+
+
+def reset_compression_cache():
+    global _active_dictionary
+    _active_dictionary = None
+    _dictionary_cache.clear()
 
 
 def get_db():
@@ -68,3 +315,105 @@ def get_db():
 def init_db():
     """Initialize database with tables"""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _add_missing_indexes()
+    _init_data_versions()
+    _migrate_legacy_bodies()
+    _backfill_draft_versions()
+
+
+def _add_missing_columns():
+    """Add columns introduced after a table was first created.
+
+    create_all() only creates missing tables, so existing databases need
+    new columns added by hand. Scalar defaults are applied to existing rows.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'
+                if column.default is not None and column.default.is_scalar:
+                    value = column.default.arg
+                    ddl += f" DEFAULT {int(value) if isinstance(value, (bool, int)) else repr(str(value))}"
+                conn.execute(text(ddl))
+                if column.index:
+                    conn.execute(text(
+                        f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} '
+                        f'ON {table.name} ("{column.name}")'
+                    ))
+
+
+def _add_missing_indexes():
+    """create_all() skips indexes on tables that already exist"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _init_data_versions():
+    db = SessionLocal()
+    try:
+        existing = {name for (name,) in db.query(DataVersion.name)}
+        for name in set(VERSIONED_TABLES.values()) - existing:
+            db.add(DataVersion(name=name, version=0))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _migrate_legacy_bodies(batch_size=500):
+    """Move plain-text bodies from emails.body into email_bodies"""
+    db = SessionLocal()
+    try:
+        while True:
+            emails = db.query(Email).filter(Email.legacy_body.isnot(None)).limit(batch_size).all()
+            if not emails:
+                break
+            for email in emails:
+                body = email.legacy_body
+                email.legacy_body = None
+                email.body = body
+            db.commit()
+            db.expunge_all()
+    finally:
+        db.close()
+
+
+def _backfill_draft_versions(batch_size=500):
+    """Number drafts saved before versioning and point emails at their
+    newest unsent one"""
+    db = SessionLocal()
+    try:
+        while True:
+            email_ids = [email_id for (email_id,) in db.query(Draft.email_id).filter(
+                Draft.version.is_(None), Draft.is_speculative == False
+            ).distinct().limit(batch_size)]
+            if not email_ids:
+                break
+            drafts = db.query(Draft).filter(
+                Draft.email_id.in_(email_ids), Draft.is_speculative == False
+            ).order_by(Draft.email_id, Draft.created_at, Draft.id).all()
+            # Renumber every version of the email so drafts saved after the
+            # upgrade stay newest
+            newest_unsent = {}
+            version = 0
+            for i, draft in enumerate(drafts):
+                if i == 0 or draft.email_id != drafts[i - 1].email_id:
+                    version = 0
+                version += 1
+                draft.version = version
+                if not draft.is_sent:
+                    newest_unsent[draft.email_id] = draft.id
+            for email in db.query(Email).filter(Email.id.in_(email_ids), Email.current_draft_id.is_(None)):
+                email.current_draft_id = newest_unsent.get(email.id)
+            db.commit()
+            db.expunge_all()
+    finally:
+        db.close()
@@ -0,0 +1,170 @@
+"""
+Draft reply generation, shared by process_email and the background job
+that pre-generates drafts for important unread emails.
+
+Drafts are versioned per email: the newest version becomes the email's
+current draft and unsent versions beyond DRAFT_VERSIONS_KEPT are pruned.
+Speculative drafts carry a fingerprint of the email and the auto_reply
+prompt they were generated from; once either changes the draft is
+discarded and regenerated. They only get a version once claimed.
+"""
+import hashlib
+from typing import Dict, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from background import register_job
+from config import settings
+from database import SessionLocal, Email, Prompt, Draft
+from llm_service import llm_service
+from threads import assign_thread, update_thread_summary, strip_quoted_history
+from similarity import reuse_similar_draft
+import events
+
+# Emails looked at and drafts generated per background pass
+CANDIDATE_LIMIT = 50
+DRAFTS_PER_PASS = 5
+
+
+def active_auto_reply_prompt(db: Session) -> Optional[Prompt]:
+    return db.query(Prompt).filter(
+        Prompt.prompt_type == "auto_reply", Prompt.is_active == True
+    ).first()
+
+
+def draft_fingerprint(email: Email, prompt: Optional[Prompt], tone: str = "professional") -> str:
+    digest = hashlib.sha1()
+    for part in (email.subject, email.body, prompt.content if prompt else "", tone):
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+async def generate_draft(db: Session, email: Email, prompt: Optional[Prompt]) -> Dict:
+    """Ask the LLM for a reply, using the thread summary as context.
+
+    A near-identical email that already has a draft short-circuits the
+    LLM call; its draft is reused with the greeting adapted.
+    """
+    reused = reuse_similar_draft(db, email)
+    if reused:
+        return reused
+    # Earlier messages reach the LLM as a rolling summary instead of
+    # the quoted history repeated in every reply
+    thread = assign_thread(db, email)
+    thread_summary = await update_thread_summary(db, thread, llm_service, before_email_id=email.id)
+    return await llm_service.generate_draft_reply(
+        email.subject,
+        strip_quoted_history(email.body) if thread_summary else email.body,
+        custom_prompt=prompt.content if prompt else None,
+        thread_summary=thread_summary
+    )
+
+
+def make_current(db: Session, email: Email, draft: Draft):
+    """Give the draft the next version number and point the email at it"""
+    latest = db.query(func.max(Draft.version)).filter(Draft.email_id == email.id).scalar() or 0
+    draft.version = latest + 1
+    draft.is_speculative = False
+    db.flush()
+    email.current_draft_id = draft.id
+    prune_draft_versions(db, email.id)
+
+
+def prune_draft_versions(db: Session, email_id: int, keep: Optional[int] = None):
+    """Delete unsent versions older than the newest `keep`"""
+    keep = settings.draft_versions_kept if keep is None else keep
+    stale = db.query(Draft).filter(
+        Draft.email_id == email_id,
+        Draft.is_speculative == False,
+        Draft.is_sent == False
+    ).order_by(Draft.version.desc(), Draft.created_at.desc()).offset(keep).all()
+    for draft in stale:
+        db.delete(draft)
+
+
+def save_draft(db: Session, email: Email, draft_result: Dict, tone: str = "professional") -> Draft:
+    draft = Draft(
+        email_id=email.id,
+        subject=draft_result.get("subject", f"Re: {email.subject}"),
+        body=draft_result.get("body", ""),
+        tone=tone
+    )
+    db.add(draft)
+    make_current(db, email, draft)
+    return draft
+
+
+def take_speculative_draft(db: Session, email: Email, prompt: Optional[Prompt]) -> Optional[Draft]:
+    """Claim a still-valid pre-generated draft for the email, if any"""
+    fingerprint = draft_fingerprint(email, prompt)
+    draft = None
+    for candidate in db.query(Draft).filter(Draft.email_id == email.id, Draft.is_speculative == True):
+        if draft is None and candidate.source_hash == fingerprint:
+            draft = candidate
+        else:
+            db.delete(candidate)
+    if draft:
+        make_current(db, email, draft)
+    return draft
+
+
+def discard_speculative_drafts(db: Session):
+    """Drop all pre-generated drafts, e.g. after the auto_reply prompt changed"""
+    # Deleted one by one so the drafts data version is bumped on flush
+    for draft in db.query(Draft).filter(Draft.is_speculative == True):
+        db.delete(draft)
+
+
+async def pregenerate_drafts():
+    """Generate drafts for unread High priority or actionable emails.
+
+    Runs only while this worker has no LLM calls in flight, so user
+    requests are never queued behind speculative work.
+    """
+    db = SessionLocal()
+    try:
+        prompt = active_auto_reply_prompt(db)
+        has_real_draft = db.query(Draft.id).filter(
+            Draft.email_id == Email.id, Draft.is_speculative == False
+        ).exists()
+        candidates = db.query(Email).filter(
+            Email.is_read == False,
+            or_(Email.priority == "High", Email.has_action_items == True),
+            ~has_real_draft
+        ).order_by(Email.received_at.desc()).limit(CANDIDATE_LIMIT).all()
+
+        generated = 0
+        for email in candidates:
+            if generated >= DRAFTS_PER_PASS or llm_service.in_flight > 0:
+                break
+            fingerprint = draft_fingerprint(email, prompt)
+            existing = db.query(Draft).filter(Draft.email_id == email.id, Draft.is_speculative == True).all()
+            if any(draft.source_hash == fingerprint for draft in existing):
+                continue
+            for draft in existing:
+                db.delete(draft)
+
+            draft_result = await generate_draft(db, email, prompt)
+            if draft_result.get("error"):
+                db.rollback()
+                continue
+            draft = Draft(
+                email_id=email.id,
+                subject=draft_result.get("subject", f"Re: {email.subject}"),
+                body=draft_result.get("body", ""),
+                tone="professional",
+                is_speculative=True,
+                source_hash=fingerprint
+            )
+            db.add(draft)
+            db.commit()
+            generated += 1
+            await events.publish("draft.created", email_id=email.id, draft_id=draft.id, speculative=True)
+    finally:
+        db.close()
+
+
+if settings.speculative_draft_interval > 0:
+    register_job("pregenerate_drafts", settings.speculative_draft_interval, pregenerate_drafts)
@@ -0,0 +1,168 @@
+"""
+Real-time inbox events pushed to clients over WebSocket.
+
+Write paths call publish(); the broker delivers each event to the hub of
+every worker process, and the hub fans it out to that worker's connected
+clients. Each connection has its own bounded queue so one slow client
+can't hold up the others.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from background import register_job
+from config import settings
+from database import SessionLocal, Event
+
+POLL_INTERVAL = 0.5  # seconds, database broker only
+EVENT_RETENTION = timedelta(minutes=10)
+
+
+class Connection:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, event: Dict):
+        """Queue an event without blocking; drop the oldest when full"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next_event(self) -> Dict:
+        if self.dropped:
+            # Tell the client it missed events so it can refetch
+            dropped, self.dropped = self.dropped, 0
+            return {"type": "resync", "data": {"dropped": dropped}}
+        return await self.queue.get()
+
+
+class EventHub:
+    """Connections of this worker process"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.connections: Set[Connection] = set()
+
+    def broadcast(self, event: Dict):
+        for connection in list(self.connections):
+            connection.offer(event)
+
+    async def serve(self, websocket: WebSocket):
+        await websocket.accept()
+        connection = Connection(websocket, self.queue_size)
+        self.connections.add(connection)
+        receiver = asyncio.create_task(self._drain_incoming(websocket))
+        try:
+            while not receiver.done():
+                getter = asyncio.create_task(connection.next_event())
+                done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                await websocket.send_json(getter.result())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+            self.connections.discard(connection)
+
+    async def _drain_incoming(self, websocket: WebSocket):
+        # Clients don't send anything meaningful; this just notices disconnects
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+
+class LocalBroker:
+    """Delivers events within the current process only"""
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: Dict):
+        self.hub.broadcast(event)
+
+
+class DatabaseBroker:
+    """Relays events through the events table so all workers receive them.
+
+    Stand-in for a real message broker: publish() appends a row and each
+    worker tails the table from the id it last saw.
+    """
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+        self.last_id = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        db = SessionLocal()
+        try:
+            latest = db.query(Event.id).order_by(Event.id.desc()).first()
+            self.last_id = latest[0] if latest else 0
+        finally:
+            db.close()
+        self.task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def publish(self, event: Dict):
+        db = SessionLocal()
+        try:
+            db.add(Event(event_type=event["type"], payload=json.dumps(event)))
+            db.commit()
+        finally:
+            db.close()
+
+    async def prune(self):
+        """Delete relayed events older than EVENT_RETENTION"""
+        db = SessionLocal()
+        try:
+            db.query(Event).filter(Event.created_at < datetime.utcnow() - EVENT_RETENTION).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            db = SessionLocal()
+            try:
+                rows = db.query(Event).filter(Event.id > self.last_id).order_by(Event.id).all()
+                for row in rows:
+                    self.hub.broadcast(json.loads(row.payload))
+                    self.last_id = row.id
+            except Exception as e:
+                print(f"Error polling events: {str(e)}")
+            finally:
+                db.close()
+
+
+hub = EventHub(settings.event_queue_size)
+broker = DatabaseBroker(hub) if settings.event_broker == "database" else LocalBroker(hub)
+if isinstance(broker, DatabaseBroker):
+    register_job("prune_events", 60, broker.prune)
+
+
+async def publish(event_type: str, **data):
+    """Publish an event such as email.created or job.progress"""
+    await broker.publish({
+        "type": event_type,
+        "at": datetime.utcnow().isoformat(),
+        "data": data
+    })
@@ -0,0 +1,217 @@
+"""
+Streaming export of emails, drafts and tasks as JSONL, CSV or Parquet.
+
+Rows are read with yield_per and written out chunk by chunk, so memory
+stays constant no matter how many emails are exported. Used by the
+/api/export endpoints and runnable as a script:
+
+    python export.py emails --format csv --category Work --output work.csv
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from compression import decompress_body
+from database import SessionLocal, Email, EmailBody, Draft, get_compression_dictionary
+from serialization import dumps
+
+YIELD_PER = 1000
+PARQUET_ROW_GROUP = 10000
+
+FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# (field, type) per export; types drive the Parquet schema
+EMAIL_FIELDS = [
+    ("id", "int"), ("sender", "str"), ("sender_name", "str"), ("recipient", "str"),
+    ("subject", "str"), ("body", "str"), ("category", "str"), ("priority", "str"),
+    ("received_at", "datetime"), ("is_read", "bool"), ("has_action_items", "bool"),
+    ("action_items", "str"), ("sentiment", "str"), ("thread_id", "int"),
+]
+DRAFT_FIELDS = [
+    ("id", "int"), ("email_id", "int"), ("version", "int"), ("subject", "str"),
+    ("body", "str"), ("tone", "str"), ("created_at", "datetime"), ("is_sent", "bool"),
+    ("is_speculative", "bool"),
+]
+TASK_FIELDS = [
+    ("email_id", "int"), ("email_subject", "str"), ("task", "str"),
+    ("deadline", "str"), ("priority", "str"),
+]
+
+
+def iter_emails(category: Optional[str] = None) -> Iterator[Dict]:
+    db = SessionLocal()
+    try:
+        columns = [getattr(Email, name) for name, _ in EMAIL_FIELDS if name != "body"]
+        query = select(
+            *columns, Email.legacy_body.label("legacy_body"), EmailBody.codec, EmailBody.data, EmailBody.dict_id
+        ).outerjoin(EmailBody, EmailBody.email_id == Email.id).order_by(Email.id)
+        if category:
+            query = query.where(Email.category == category)
+        for row in db.execute(query.execution_options(yield_per=YIELD_PER)).mappings():
+            record = {name: row[name] for name, _ in EMAIL_FIELDS if name != "body"}
+            if row["codec"] is not None:
+                record["body"] = decompress_body(row["codec"], row["data"], get_compression_dictionary(row["dict_id"]))
+            else:
+                record["body"] = row["legacy_body"]
+            yield record
+    finally:
+        db.close()
+
+
+def iter_drafts(category: Optional[str] = None, email_id: Optional[int] = None) -> Iterator[Dict]:
+    db = SessionLocal()
+    try:
+        query = select(*[getattr(Draft, name) for name, _ in DRAFT_FIELDS]).order_by(Draft.id)
+        if category:
+            query = query.join(Email, Email.id == Draft.email_id).where(Email.category == category)
+        if email_id:
+            query = query.where(Draft.email_id == email_id)
+        for row in db.execute(query.execution_options(yield_per=YIELD_PER)).mappings():
+            yield dict(row)
+    finally:
+        db.close()
+
+
+def iter_tasks(category: Optional[str] = None) -> Iterator[Dict]:
+    """One row per extracted action item"""
+    db = SessionLocal()
+    try:
+        query = select(Email.id, Email.subject, Email.action_items).where(
+            Email.has_action_items == True
+        ).order_by(Email.id)
+        if category:
+            query = query.where(Email.category == category)
+        for row in db.execute(query.execution_options(yield_per=YIELD_PER)):
+            try:
+                items = json.loads(row.action_items or "[]")
+            except json.JSONDecodeError:
+                continue
+            for item in items:
+                if not isinstance(item, dict):
+                    item = {"task": str(item)}
+                yield {
+                    "email_id": row.id,
+                    "email_subject": row.subject,
+                    "task": item.get("task"),
+                    "deadline": item.get("deadline"),
+                    "priority": item.get("priority"),
+                }
+    finally:
+        db.close()
+
+
+EXPORTS = {
+    "emails": (iter_emails, EMAIL_FIELDS),
+    "drafts": (iter_drafts, DRAFT_FIELDS),
+    "tasks": (iter_tasks, TASK_FIELDS),
+}
+
+
+def jsonl_chunks(rows: Iterator[Dict], fields) -> Iterator[bytes]:
+    batch = []
+    for row in rows:
+        batch.append(dumps(row))
+        if len(batch) >= YIELD_PER:
+            yield b"\n".join(batch) + b"\n"
+            batch = []
+    if batch:
+        yield b"\n".join(batch) + b"\n"
+
+
+def csv_chunks(rows: Iterator[Dict], fields) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=[name for name, _ in fields])
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % YIELD_PER == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_chunks(rows: Iterator[Dict], fields) -> Iterator[bytes]:
+    # pyarrow is optional; only Parquet exports need it
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int": pa.int64(), "str": pa.string(), "bool": pa.bool_(), "datetime": pa.timestamp("us")}
+    schema = pa.schema([(name, types[kind]) for name, kind in fields])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= PARQUET_ROW_GROUP:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            batch = []
+            yield sink.drain()
+    if batch:
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    writer.close()
+    yield sink.drain()
+
+
+WRITERS = {"jsonl": jsonl_chunks, "csv": csv_chunks, "parquet": parquet_chunks}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_chunks(resource: str, fmt: str, **filters) -> Tuple[Iterator[bytes], str]:
+    """Return (byte chunks, media type) for an export"""
+    iterate, fields = EXPORTS[resource]
+    return WRITERS[fmt](iterate(**filters), fields), FORMATS[fmt]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export emails, drafts or tasks")
+    parser.add_argument("resource", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="jsonl")
+    parser.add_argument("--category", help="only emails in this category")
+    parser.add_argument("--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+
+    chunks, _ = export_chunks(args.resource, args.format, category=args.category)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for running the API on all cores:
+
+    cd backend
+    gunicorn main:app -c gunicorn.conf.py
+
+Set WORKERS in .env; with more than one worker events are relayed
+through the database.
+"""
+from config import settings, prepare_worker_settings
+
+bind = f"{settings.host}:{settings.port}"
+workers = settings.workers
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    """Create the schema once in the master before workers are forked"""
+    from database import init_db
+    init_db()
+    if server.cfg.workers > 1:
+        # -w on the command line may differ from WORKERS
+        prepare_worker_settings(server.cfg.workers)
+    else:
+        settings.init_db_on_startup = False
@@ -0,0 +1,108 @@
+"""
+Conditional GET support for read endpoints.
+
+Every response under a versioned path gets an ETag and Last-Modified
+derived from the data_versions counters, so unchanged data is answered
+with 304 Not Modified. The hottest list endpoints also keep their
+serialized body in a small in-process cache keyed by the same ETag.
+"""
+import hashlib
+from collections import OrderedDict
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import timezone
+
+from fastapi import Request, Response
+
+from database import get_data_versions
+
+# Path prefix -> data versions its responses depend on
+VERSIONED_PATHS = [
+    ("/api/emails", ("emails",)),
+    ("/api/threads", ("emails", "threads")),
+    ("/api/prompts", ("prompts",)),
+    ("/api/drafts", ("drafts",)),
+    ("/api/stats", ("emails", "drafts")),
+]
+
+# Exact paths whose bodies are kept in the response cache
+CACHED_PATHS = {"/api/emails", "/api/prompts", "/api/drafts", "/api/stats"}
+
+MAX_CACHE_ENTRIES = 128
+MAX_CACHED_BODY = 1024 * 1024
+
+_response_cache = OrderedDict()
+
+
+def _dependencies(path):
+    for prefix, names in VERSIONED_PATHS:
+        if path == prefix or path.startswith(prefix + "/"):
+            return names
+    return None
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _cache_headers(etag, last_modified):
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+async def conditional_get_middleware(request: Request, call_next):
+    names = _dependencies(request.url.path) if request.method == "GET" else None
+    if not names:
+        return await call_next(request)
+
+    versions = get_data_versions(names)
+    cache_key = f"{request.url.path}?{request.url.query}"
+    digest = hashlib.sha1(cache_key.encode("utf-8"))
+    for name in names:
+        digest.update(f"|{name}:{versions.get(name, (0, None))[0]}".encode("utf-8"))
+    etag = f'"{digest.hexdigest()}"'
+
+    updated = [updated_at for _, updated_at in versions.values() if updated_at]
+    last_modified = max(updated).replace(tzinfo=timezone.utc) if updated else None
+    headers = _cache_headers(etag, last_modified)
+
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    cached = _response_cache.get(cache_key)
+    if cached and cached[0] == etag:
+        _response_cache.move_to_end(cache_key)
+        return Response(content=cached[1], media_type="application/json", headers=headers)
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    if request.url.path in CACHED_PATHS and len(body) <= MAX_CACHED_BODY:
+        _response_cache[cache_key] = (etag, body)
+        _response_cache.move_to_end(cache_key)
+        while len(_response_cache) > MAX_CACHE_ENTRIES:
+            _response_cache.popitem(last=False)
+
+    response_headers = dict(response.headers)
+    response_headers.pop("content-length", None)
+    response_headers.update(headers)
+    return Response(
+        content=body,
+        status_code=response.status_code,
+        headers=response_headers,
+        media_type=response.media_type
+    )
@@ -0,0 +1,239 @@
+"""
+LLM providers and the router that picks one per task.
+
+Each task type (categorize, extract_tasks, summarize, draft, chat) has an
+ordered chain of models. The router tries them in order, moving on when a
+call fails or exceeds the latency SLO, and records latency and estimated
+cost per model.
+"""
+import asyncio
+import json
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from config import settings
+
+# USD per million tokens (input, output); unknown models count as free
+MODEL_PRICES = {
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+TASKS = ("categorize", "extract_tasks", "summarize", "draft", "chat")
+# Tasks that only need a cheap, fast model
+FAST_TASKS = {"categorize", "extract_tasks", "summarize"}
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return max(1, len(text or "") // 4)
+
+
+def _email_body(prompt: str) -> str:
+    """Best-effort extraction of the email body from a filled-in prompt"""
+    match = re.search(r"Body:\s*(.*?)(?:\n\s*\n(?:Respond|Return|Guidelines)\b|\Z)", prompt, re.DOTALL)
+    return match.group(1) if match else prompt
+
+
+class LLMProvider(ABC):
+    """A single model behind a common generate() interface"""
+
+    def __init__(self, name: str, model: str):
+        self.name = name
+        self.model = model
+
+    @abstractmethod
+    async def generate(self, prompt: str, task: str) -> str:
+        ...
+
+    def cost(self, input_tokens: int, output_tokens: int) -> float:
+        input_price, output_price = MODEL_PRICES.get(self.model, (0.0, 0.0))
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini model; the client is created on first use"""
+
+    def __init__(self, model: str):
+        super().__init__(f"gemini:{model}", model)
+        self._client = None
+
+    @property
+    def client(self):
+        # google.generativeai takes about half a second to import, so it
+        # is only loaded once an LLM call is actually made
+        if self._client is None:
+            if not settings.gemini_api_key:
+                raise RuntimeError("GEMINI_API_KEY is not configured")
+            import google.generativeai as genai
+            genai.configure(api_key=settings.gemini_api_key)
+            self._client = genai.GenerativeModel(self.model)
+        return self._client
+
+    async def generate(self, prompt: str, task: str) -> str:
+        # The SDK call blocks, so keep it off the event loop
+        response = await asyncio.to_thread(self.client.generate_content, prompt)
+        return response.text
+
+
+class LocalProvider(LLMProvider):
+    """Offline stand-in that answers instantly with rule-based output.
+
+    Used for development without credentials and for exercising routing:
+    latency and fail can be set to simulate slow or broken models.
+    """
+
+    def __init__(self, name: str = "local", latency: float = 0.0, fail: bool = False):
+        super().__init__(name, name)
+        self.latency = latency
+        self.fail = fail
+
+    async def generate(self, prompt: str, task: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is unavailable")
+
+        body = _email_body(prompt)
+        text = body.lower()
+        if task == "categorize":
+            category = "Work"
+            if any(word in text for word in ("sale", "% off", "unsubscribe", "offer")):
+                category = "Promotional"
+            elif any(word in text for word in ("newsletter", "digest", "top stories")):
+                category = "Newsletter"
+            priority = "High" if any(word in text for word in ("urgent", "asap", "deadline", "action required")) else "Medium"
+            return json.dumps({
+                "category": category,
+                "priority": priority,
+                "sentiment": "Neutral",
+                "reasoning": "Keyword rules (local provider)"
+            })
+        if task == "extract_tasks":
+            items = [
+                {"task": line.strip(" -*0123456789."), "deadline": None, "priority": "Medium"}
+                for line in body.splitlines()
+                if re.match(r"\s*(\d+\.|-|\*)\s+\w", line)
+            ]
+            return json.dumps({"has_action_items": bool(items), "action_items": items, "summary": ""})
+        if task == "draft":
+            subject = re.search(r"Subject: (.*)", prompt)
+            return json.dumps({
+                "subject": f"Re: {subject.group(1).strip() if subject else ''}",
+                "body": "Thank you for your email. I will get back to you shortly.\n\nBest regards",
+                "key_points": []
+            })
+        if task == "summarize":
+            return " ".join(body.split())[:300]
+        return "I'm running in offline mode and can't analyze the inbox right now."
+
+
+class ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.total_latency = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+
+    def as_dict(self) -> Dict:
+        successes = self.calls - self.failures - self.timeouts
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "avg_latency_ms": round(self.total_latency / successes * 1000, 1) if successes else None,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost, 6),
+        }
+
+
+class AllModelsFailed(Exception):
+    pass
+
+
+class ModelRouter:
+    def __init__(self, providers: Dict[str, LLMProvider], routes: Dict[str, List[str]],
+                 latency_slo: Optional[float] = None):
+        self.providers = providers
+        self.routes = routes
+        self.latency_slo = latency_slo
+        self.stats = {name: ModelStats() for name in providers}
+
+    async def generate(self, task: str, prompt: str) -> str:
+        """Run the prompt on the first model in the task's chain that succeeds"""
+        errors = []
+        for name in self.routes.get(task) or self.routes["chat"]:
+            provider = self.providers[name]
+            stats = self.stats[name]
+            stats.calls += 1
+            start = time.perf_counter()
+            input_tokens = estimate_tokens(prompt)
+            try:
+                text = await asyncio.wait_for(provider.generate(prompt, task), timeout=self.latency_slo)
+            except asyncio.TimeoutError:
+                # A blocking SDK call can't be cancelled and is still billed;
+                # count the input at least, its output is never seen
+                stats.timeouts += 1
+                stats.input_tokens += input_tokens
+                stats.cost += provider.cost(input_tokens, 0)
+                errors.append(f"{name}: exceeded {self.latency_slo}s")
+                continue
+            except Exception as e:
+                stats.failures += 1
+                errors.append(f"{name}: {str(e)}")
+                continue
+
+            output_tokens = estimate_tokens(text)
+            stats.total_latency += time.perf_counter() - start
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost += provider.cost(input_tokens, output_tokens)
+            return text
+
+        raise AllModelsFailed("; ".join(errors))
+
+    def stats_report(self) -> Dict:
+        return {
+            "routes": self.routes,
+            "models": {name: stats.as_dict() for name, stats in self.stats.items()}
+        }
+
+
+def build_router() -> ModelRouter:
+    """Router from settings: fast model for light tasks, strong model for
+    drafts and chat, each falling back to the other and then to the
+    optional LLM_FALLBACK_MODEL"""
+    if settings.llm_provider == "local":
+        providers = {"local": LocalProvider()}
+        return ModelRouter(providers, {task: ["local"] for task in TASKS}, settings.llm_latency_slo_seconds)
+
+    # Without GEMINI_FAST_MODEL every task uses the model the user chose
+    fast_model = settings.gemini_fast_model or settings.gemini_model
+    providers = {}
+    for model in (fast_model, settings.gemini_model, settings.llm_fallback_model):
+        if model:
+            provider = GeminiProvider(model)
+            providers.setdefault(provider.name, provider)
+
+    fast = f"gemini:{fast_model}"
+    strong = f"gemini:{settings.gemini_model}"
+    fallback = f"gemini:{settings.llm_fallback_model}" if settings.llm_fallback_model else None
+
+    routes = {}
+    for task in TASKS:
+        chain = [fast, strong] if task in FAST_TASKS else [strong, fast]
+        if fallback:
+            chain.append(fallback)
+        # Same model may be configured twice; keep the first occurrence
+        routes[task] = list(dict.fromkeys(chain))
+    return ModelRouter(providers, routes, settings.llm_latency_slo_seconds)
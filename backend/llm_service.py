@@ -1,14 +1,62 @@
-import google.generativeai as genai
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
 import json
+import time
 from config import settings
+from llm_providers import ModelRouter, build_router
 
-genai.configure(api_key=settings.gemini_api_key)
+
+class RateBudget:
+    """Sliding one-minute window of allowed LLM calls for this process"""
+    
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.calls = deque()
+    
+    async def acquire(self):
+        if self.per_minute <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            while self.calls and now - self.calls[0] >= 60:
+                self.calls.popleft()
+            if len(self.calls) < self.per_minute:
+                self.calls.append(now)
+                return
+            await asyncio.sleep(60 - (now - self.calls[0]))
+
+
+def worker_rate_budget() -> RateBudget:
+    """Split the global LLM budget evenly between worker processes"""
+    per_minute = settings.llm_requests_per_minute
+    if per_minute > 0:
+        per_minute = max(1, per_minute // max(1, settings.workers))
+    return RateBudget(per_minute)
 
 
 class LLMService:
-    def __init__(self):
-        self.model = genai.GenerativeModel(settings.gemini_model)
+    def __init__(self, router: Optional[ModelRouter] = None):
+        self.router = router or build_router()
+        self.budget = worker_rate_budget()
+        self.in_flight = 0  # LLM calls currently running in this process
+        self.waiting = 0  # LLM calls queued on the rate budget
+    
+    @property
+    def queue_depth(self) -> int:
+        return self.waiting + self.in_flight
+    
+    async def _generate(self, prompt: str, task: str) -> str:
+        self.waiting += 1
+        try:
+            await self.budget.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await self.router.generate(task, prompt)
+        finally:
+            self.in_flight -= 1
     
     async def categorize_email(self, email_subject: str, email_body: str, custom_prompt: Optional[str] = None) -> Dict:
         """Categorize email using LLM"""
@@ -29,8 +77,7 @@ Respond ONLY with a valid JSON object (no markdown, no extra text) with these ex
         prompt = prompt.format(subject=email_subject, body=email_body)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip()
+            result = (await self._generate(prompt, "categorize")).strip()
             
             # Remove markdown code blocks if present
             if result.startswith("```"):
@@ -81,8 +128,7 @@ Respond ONLY with a valid JSON object (no markdown, no extra text):
         prompt = prompt.format(subject=email_subject, body=email_body)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip()
+            result = (await self._generate(prompt, "extract_tasks")).strip()
             
             # Remove markdown code blocks if present
             if result.startswith("```"):
@@ -109,10 +155,17 @@ Respond ONLY with a valid JSON object (no markdown, no extra text):
             }
     
     async def generate_draft_reply(self, email_subject: str, email_body: str, tone: str = "professional", 
-                                   custom_prompt: Optional[str] = None) -> Dict:
-        """Generate a draft reply to an email"""
-        default_prompt = """Generate a {tone} reply to the following email.
+                                   custom_prompt: Optional[str] = None,
+                                   thread_summary: Optional[str] = None) -> Dict:
+        """Generate a draft reply to an email.
 
+        When thread_summary is given it stands in for the earlier messages
+        of the conversation, so callers should pass only the new part of
+        the email body. Templates without a {thread_context} placeholder
+        get the summary in front of the body instead.
+        """
+        default_prompt = """Generate a {tone} reply to the following email.
+{thread_context}
 Email Subject: {subject}
 Email Body: {body}
 
@@ -124,11 +177,17 @@ Respond ONLY with a valid JSON object (no markdown, no extra text):
 }}"""
         
         prompt = custom_prompt or default_prompt
-        prompt = prompt.format(subject=email_subject, body=email_body, tone=tone)
+        thread_context = ""
+        if thread_summary:
+            if "{thread_context}" in prompt:
+                thread_context = f"\nSummary of the conversation so far: {thread_summary}\n"
+            else:
+                email_body = f"[Summary of the conversation so far: {thread_summary}]\n\n{email_body}"
+        prompt = prompt.format(subject=email_subject, body=email_body, tone=tone,
+                               thread_context=thread_context)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip()
+            result = (await self._generate(prompt, "draft")).strip()
             
             # Remove markdown code blocks if present
             if result.startswith("```"):
@@ -154,6 +213,34 @@ Respond ONLY with a valid JSON object (no markdown, no extra text):
                 "error": str(e)
             }
     
+    async def summarize_thread(self, previous_summary: Optional[str],
+                               messages: List[Tuple[str, str, str]]) -> str:
+        """Fold new (sender, subject, body) messages into a rolling
+        conversation summary with a single call"""
+        new_messages = "\n\n".join(
+            f"From {sender}\nSubject: {subject}\nBody: {body}" for sender, subject, body in messages
+        )
+        prompt = f"""You maintain a running summary of an email conversation.
+Update the summary with the new messages below, oldest first. Keep it under
+120 words and keep names, decisions, open questions and deadlines.
+
+Current summary: {previous_summary or '(none, these are the first messages)'}
+
+New messages:
+
+{new_messages}
+
+Respond with the updated summary text only."""
+        
+        try:
+            return (await self._generate(prompt, "summarize")).strip()
+        except Exception as e:
+            print(f"Error in summarize_thread: {str(e)}")
+            # Keep the conversation usable even without a fresh summary
+            fallback = "\n".join(f"{sender}: {body[:300]}" for sender, _, body in messages)
+            combined = f"{previous_summary}\n{fallback}" if previous_summary else fallback
+            return combined[-2000:]
+    
     async def chat_about_inbox(self, user_message: str, context: Optional[str] = None) -> str:
         """Handle chat interactions about the inbox"""
         prompt = f"""You are an AI email assistant helping users manage their inbox.
@@ -164,8 +251,7 @@ You can answer questions about emails, help prioritize tasks, and provide insigh
 User question: {user_message}"""
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return await self._generate(prompt, "chat")
         except Exception as e:
             return f"Error processing chat: {str(e)}"
 
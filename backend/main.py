@@ -1,48 +1,77 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, WebSocket
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import json
 
-from database import get_db, init_db, Email, Prompt, Draft
+from database import get_db, init_db, Email, Prompt, Draft, Thread
 from models import (
-    EmailCreate, EmailResponse, PromptCreate, PromptResponse, PromptUpdate,
-    DraftCreate, DraftResponse, ProcessEmailRequest, ChatRequest
+    EmailCreate, EmailResponse, EmailListItem, PromptCreate, PromptResponse, PromptUpdate,
+    DraftCreate, DraftResponse, ProcessEmailRequest, ChatRequest, ThreadResponse, SimilarEmail
 )
 from llm_service import llm_service
+from threads import assign_thread
+from http_cache import conditional_get_middleware
+import events
+import background
+import export
+import admission
+import maintenance  # noqa: F401 (registers the maintenance job)
+from config import settings, prepare_worker_settings
+from similarity import index_email, find_similar
+from drafts import generate_draft, save_draft, take_speculative_draft, discard_speculative_drafts
+from serialization import FastJSONResponse, fetch_dicts, select_for
 
 app = FastAPI(title="Email Productivity Agent API")
 
-# CORS middleware
+# ETag / 304 handling and response cache for read endpoints
+app.middleware("http")(conditional_get_middleware)
+
+# Per-client rate limits and LLM load shedding, checked before the cache
+app.middleware("http")(admission.admission_middleware)
+
+# CORS middleware; added last so it wraps everything, including 429s
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=[origin.strip() for origin in settings.cors_origins.split(",") if origin.strip()],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
-    init_db()
+    if settings.init_db_on_startup:
+        init_db()
+    await events.broker.start()
+    await background.start_jobs()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await background.stop_jobs()
+    await events.broker.stop()
 
 
 # Email Endpoints
-@app.get("/api/emails", response_model=List[EmailResponse])
+@app.get("/api/emails", response_model=List[EmailListItem])
 async def get_emails(
     category: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    """Get all emails with optional category filter"""
-    query = db.query(Email)
+    """Get all emails with optional category filter; bodies are not loaded"""
+    # Projected straight to dicts, skipping ORM hydration and Pydantic
+    query = select_for(Email, EmailListItem)
     if category:
-        query = query.filter(Email.category == category)
-    emails = query.offset(skip).limit(limit).all()
-    return emails
+        query = query.where(Email.category == category)
+    return FastJSONResponse(fetch_dicts(db, query.offset(skip).limit(limit)))
 
 
 @app.get("/api/emails/{email_id}", response_model=EmailResponse)
@@ -54,13 +83,31 @@ async def get_email(email_id: int, db: Session = Depends(get_db)):
     return email
 
 
+@app.get("/api/emails/{email_id}/similar", response_model=List[SimilarEmail])
+async def get_similar_emails(email_id: int, limit: int = Query(5, le=50), db: Session = Depends(get_db)):
+    """Get the most similar emails by local embedding"""
+    email = db.query(Email).filter(Email.id == email_id).first()
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found")
+    matches = find_similar(email, k=limit)
+    rows = fetch_dicts(db, select_for(Email, EmailListItem).where(Email.id.in_([i for i, _ in matches])))
+    by_id = {row["id"]: row for row in rows}
+    return FastJSONResponse([
+        {"similarity": round(score, 4), "email": by_id[i]} for i, score in matches if i in by_id
+    ])
+
+
 @app.post("/api/emails", response_model=EmailResponse)
 async def create_email(email: EmailCreate, db: Session = Depends(get_db)):
     """Create a new email"""
     db_email = Email(**email.dict())
     db.add(db_email)
+    db.flush()
+    assign_thread(db, db_email)
+    index_email(db_email)
     db.commit()
     db.refresh(db_email)
+    await events.publish("email.created", email_id=db_email.id, thread_id=db_email.thread_id)
     return db_email
 
 
@@ -72,6 +119,7 @@ async def mark_email_read(email_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Email not found")
     email.is_read = True
     db.commit()
+    await events.publish("email.updated", email_id=email_id, fields=["is_read"])
     return {"message": "Email marked as read"}
 
 
@@ -83,6 +131,8 @@ async def process_email(email_id: int, request: ProcessEmailRequest, db: Session
         raise HTTPException(status_code=404, detail="Email not found")
     
     results = {}
+    total_steps = len([t for t in request.tasks if t in ("categorize", "extract_tasks", "generate_draft")])
+    done_steps = 0
     
     # Get custom prompts if available
     categorization_prompt = db.query(Prompt).filter(
@@ -108,6 +158,9 @@ async def process_email(email_id: int, request: ProcessEmailRequest, db: Session
         email.priority = cat_result.get("priority", "Medium")
         email.sentiment = cat_result.get("sentiment", "Neutral")
         results["categorization"] = cat_result
+        done_steps += 1
+        await events.publish("job.progress", email_id=email_id, step="categorize",
+                             completed=done_steps, total=total_steps)
     
     # Extract action items
     if "extract_tasks" in request.tasks:
@@ -119,34 +172,69 @@ async def process_email(email_id: int, request: ProcessEmailRequest, db: Session
         email.has_action_items = task_result.get("has_action_items", False)
         email.action_items = json.dumps(task_result.get("action_items", []))
         results["action_items"] = task_result
+        done_steps += 1
+        await events.publish("job.progress", email_id=email_id, step="extract_tasks",
+                             completed=done_steps, total=total_steps)
     
-    # Generate draft reply
+    # Generate draft reply, reusing a pre-generated one when still valid
     if "generate_draft" in request.tasks:
-        draft_result = await llm_service.generate_draft_reply(
-            email.subject,
-            email.body,
-            custom_prompt=auto_reply_prompt.content if auto_reply_prompt else None
-        )
-        
-        # Save draft
-        draft = Draft(
-            email_id=email.id,
-            subject=draft_result.get("subject", f"Re: {email.subject}"),
-            body=draft_result.get("body", ""),
-            tone="professional"
-        )
-        db.add(draft)
+        draft = take_speculative_draft(db, email, auto_reply_prompt)
+        if draft:
+            draft_result = {"subject": draft.subject, "body": draft.body, "key_points": [], "pregenerated": True}
+        else:
+            draft_result = await generate_draft(db, email, auto_reply_prompt)
+            draft = save_draft(db, email, draft_result)
         results["draft"] = draft_result
+        done_steps += 1
+        # Saving the draft took SQLite's write lock; release it before the
+        # database event broker writes on its own connection
+        db.commit()
+        await events.publish("job.progress", email_id=email_id, step="generate_draft",
+                             completed=done_steps, total=total_steps)
     
     db.commit()
     db.refresh(email)
     
+    if "generate_draft" in request.tasks:
+        await events.publish("draft.created", email_id=email.id, draft_id=draft.id)
+    await events.publish("email.processed", email_id=email.id, tasks=request.tasks)
+    
     return {
-        "email": EmailResponse.from_orm(email),
+        "email": EmailResponse.model_validate(email),
         "results": results
     }
 
 
+# Event Stream
+@app.websocket("/api/events")
+async def event_stream(websocket: WebSocket):
+    """Push inbox events (email.created, email.updated, email.processed,
+    draft.created, job.progress) to the client as JSON messages"""
+    await events.hub.serve(websocket)
+
+
+# Thread Endpoints
+@app.get("/api/threads", response_model=List[ThreadResponse])
+async def get_threads(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """Get threads, most recently active first"""
+    return db.query(Thread).order_by(Thread.last_message_at.desc()).offset(skip).limit(limit).all()
+
+
+@app.get("/api/threads/{thread_id}", response_model=ThreadResponse)
+async def get_thread(thread_id: int, db: Session = Depends(get_db)):
+    """Get a specific thread"""
+    thread = db.query(Thread).filter(Thread.id == thread_id).first()
+    if not thread:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    return thread
+
+
+@app.get("/api/threads/{thread_id}/emails", response_model=List[EmailResponse])
+async def get_thread_emails(thread_id: int, db: Session = Depends(get_db)):
+    """Get the emails of a thread in arrival order"""
+    return db.query(Email).filter(Email.thread_id == thread_id).order_by(Email.id).all()
+
+
 # Prompt Endpoints
 @app.get("/api/prompts", response_model=List[PromptResponse])
 async def get_prompts(db: Session = Depends(get_db)):
@@ -168,6 +256,8 @@ async def create_prompt(prompt: PromptCreate, db: Session = Depends(get_db)):
     """Create a new prompt"""
     db_prompt = Prompt(**prompt.dict())
     db.add(db_prompt)
+    if db_prompt.prompt_type == "auto_reply":
+        discard_speculative_drafts(db)
     db.commit()
     db.refresh(db_prompt)
     return db_prompt
@@ -183,6 +273,8 @@ async def update_prompt(prompt_id: int, prompt: PromptUpdate, db: Session = Depe
     update_data = prompt.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_prompt, key, value)
+    if db_prompt.prompt_type == "auto_reply":
+        discard_speculative_drafts(db)
     
     db.commit()
     db.refresh(db_prompt)
@@ -196,18 +288,32 @@ async def delete_prompt(prompt_id: int, db: Session = Depends(get_db)):
     if not prompt:
         raise HTTPException(status_code=404, detail="Prompt not found")
     db.delete(prompt)
+    if prompt.prompt_type == "auto_reply":
+        discard_speculative_drafts(db)
     db.commit()
     return {"message": "Prompt deleted"}
 
 
 # Draft Endpoints
 @app.get("/api/drafts", response_model=List[DraftResponse])
-async def get_drafts(email_id: Optional[int] = None, db: Session = Depends(get_db)):
-    """Get all drafts"""
-    query = db.query(Draft)
+async def get_drafts(
+    email_id: Optional[int] = None,
+    current_only: bool = False,
+    is_speculative: Optional[bool] = None,
+    skip: int = 0,
+    limit: int = Query(100, le=500),
+    db: Session = Depends(get_db)
+):
+    """Get drafts, newest first"""
+    query = select_for(Draft, DraftResponse)
     if email_id:
-        query = query.filter(Draft.email_id == email_id)
-    return query.all()
+        query = query.where(Draft.email_id == email_id)
+    if current_only:
+        query = query.where(Draft.id.in_(select(Email.current_draft_id)))
+    if is_speculative is not None:
+        query = query.where(Draft.is_speculative == is_speculative)
+    query = query.order_by(Draft.created_at.desc(), Draft.id.desc()).offset(skip).limit(limit)
+    return FastJSONResponse(fetch_dicts(db, query))
 
 
 @app.get("/api/drafts/{draft_id}", response_model=DraftResponse)
@@ -239,6 +345,42 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
     return {"response": response}
 
 
+# Export Endpoint
+@app.get("/api/export/{resource}")
+async def export_data(
+    resource: str,
+    format: str = "jsonl",
+    category: Optional[str] = None,
+    email_id: Optional[int] = None
+):
+    """Stream emails, drafts or tasks as JSONL, CSV or Parquet"""
+    if resource not in export.EXPORTS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be jsonl, csv or parquet")
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    filters = {"category": category}
+    if resource == "drafts":
+        filters["email_id"] = email_id
+    chunks, media_type = export.export_chunks(resource, format, **filters)
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{resource}.{format}"'}
+    )
+
+
+# LLM Router Endpoint
+@app.get("/api/llm/stats")
+async def get_llm_stats():
+    """Per-model call counts, failures, latency and estimated cost, plus
+    admission control counters"""
+    report = llm_service.router.stats_report()
+    report["admission"] = admission.controller.stats_report()
+    return report
+
+
 # Statistics Endpoint
 @app.get("/api/stats")
 async def get_stats(db: Session = Depends(get_db)):
@@ -263,5 +405,10 @@ async def get_stats(db: Session = Depends(get_db)):
 
 if __name__ == "__main__":
     import uvicorn
-    from config import settings
-    uvicorn.run(app, host=settings.host, port=settings.port)
+    if settings.workers > 1:
+        # Create the schema once here rather than racing in every worker
+        init_db()
+        prepare_worker_settings(settings.workers)
+        uvicorn.run("main:app", host=settings.host, port=settings.port, workers=settings.workers)
+    else:
+        uvicorn.run(app, host=settings.host, port=settings.port)
@@ -0,0 +1,199 @@
+"""
+Scheduled database maintenance.
+
+Keeps the hot tables small: if ARCHIVE_AFTER_DAYS is set, older emails
+are moved, with their drafts, into archived_emails as compressed JSON
+(one way; nothing reads them back), and
+superseded drafts older than DRAFT_RETENTION_DAYS are deleted. Freed
+pages are then returned to the filesystem with an incremental vacuum and
+planner statistics refreshed with ANALYZE and PRAGMA optimize. Each pass
+reports how long every step took and how much space was reclaimed.
+
+Runs every MAINTENANCE_INTERVAL seconds in one worker, or once with:
+
+    python maintenance.py
+
+which also converts a database created before incremental auto-vacuum;
+stop the server first, as that takes a full VACUUM.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import and_, inspect, or_
+from sqlalchemy.orm import Session, selectinload
+
+from background import register_job
+from compression import compress_body
+from config import settings
+from database import (
+    SessionLocal, engine, init_db, Email, Draft, ArchivedEmail, get_active_compression_dictionary
+)
+from serialization import dumps
+from similarity import unindex_email
+from threads import refresh_thread_counts
+import events
+
+BATCH_SIZE = 500
+# Rows sampled per index by ANALYZE; keeps it fast on large tables
+ANALYSIS_LIMIT = 1000
+
+EMAIL_COLUMNS = [attr.key for attr in inspect(Email).column_attrs if attr.key != "legacy_body"]
+DRAFT_COLUMNS = [attr.key for attr in inspect(Draft).column_attrs]
+
+
+def _row(obj, columns) -> Dict:
+    # Nulls are left out to keep archived records small
+    return {name: getattr(obj, name) for name in columns if getattr(obj, name) is not None}
+
+
+def archive_emails(db: Session, older_than: datetime) -> int:
+    """Move emails received before older_than, with their drafts, into archived_emails"""
+    dict_id, zdict = get_active_compression_dictionary()
+    archived = 0
+    while True:
+        emails = db.query(Email).options(selectinload(Email.body_record)).filter(
+            Email.received_at < older_than
+        ).order_by(Email.id).limit(BATCH_SIZE).all()
+        if not emails:
+            break
+        drafts = defaultdict(list)
+        for draft in db.query(Draft).filter(Draft.email_id.in_([email.id for email in emails])).order_by(Draft.id):
+            drafts[draft.email_id].append(draft)
+
+        for email in emails:
+            record = _row(email, EMAIL_COLUMNS)
+            record["body"] = email.body
+            record["drafts"] = [_row(draft, DRAFT_COLUMNS) for draft in drafts[email.id]]
+            codec, data = compress_body(dumps(record).decode("utf-8"), zdict)
+            db.add(ArchivedEmail(
+                email_id=email.id,
+                sender=email.sender,
+                subject=email.subject,
+                category=email.category,
+                received_at=email.received_at,
+                codec=codec,
+                dict_id=dict_id if codec == "zlib-dict" else None,
+                data=data
+            ))
+            # Deleted one by one so the data versions are bumped on flush
+            for draft in drafts[email.id]:
+                db.delete(draft)
+            db.delete(email)
+            unindex_email(email.id)
+        refresh_thread_counts(db, [email.thread_id for email in emails])
+        db.commit()
+        db.expunge_all()
+        archived += len(emails)
+    return archived
+
+
+def prune_drafts(db: Session, older_than: datetime) -> int:
+    """Delete drafts of deleted emails, and unsent drafts created before
+    older_than that are no longer their email's current draft"""
+    pruned = 0
+    while True:
+        drafts = db.query(Draft).outerjoin(Email, Email.id == Draft.email_id).filter(or_(
+            Email.id.is_(None),
+            and_(
+                Draft.created_at < older_than,
+                Draft.is_sent == False,
+                or_(Email.current_draft_id.is_(None), Email.current_draft_id != Draft.id)
+            )
+        )).limit(BATCH_SIZE).all()
+        if not drafts:
+            break
+        for draft in drafts:
+            db.delete(draft)
+        db.commit()
+        pruned += len(drafts)
+    return pruned
+
+
+def _database_size(conn) -> int:
+    page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+    return conn.exec_driver_sql("PRAGMA page_count").scalar() * page_size
+
+
+def compact_database(report: Dict, convert: bool = False):
+    """Vacuum freed pages and refresh planner statistics (SQLite only).
+
+    Databases created before incremental auto-vacuum need one full VACUUM
+    to switch over. That rewrites the whole file under an exclusive lock,
+    so it only happens when convert is set (python maintenance.py);
+    scheduled passes skip the vacuum until then.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    # VACUUM can't run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        start = time.perf_counter()
+        report["bytes_before"] = _database_size(conn)
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            # A plain execute() frees a single page per step; executescript
+            # runs the pragma to completion
+            conn.connection.driver_connection.executescript("PRAGMA incremental_vacuum")
+        elif convert:
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+            report["full_vacuum"] = True
+        else:
+            report["vacuum_skipped"] = "not in incremental auto-vacuum mode; run python maintenance.py offline to convert"
+        report["bytes_after"] = _database_size(conn)
+        # Converting adds pointer-map pages, which can outweigh what was freed
+        report["reclaimed_bytes"] = max(0, report["bytes_before"] - report["bytes_after"])
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        report["timings"]["vacuum"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        conn.exec_driver_sql(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize")
+        report["timings"]["analyze"] = round(time.perf_counter() - start, 3)
+
+
+def run_maintenance(convert: bool = False) -> Dict:
+    """Run one maintenance pass and return what it did"""
+    report = {"archived_emails": 0, "pruned_drafts": 0, "full_vacuum": False, "timings": {}}
+    started = time.perf_counter()
+    now = datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        steps = []
+        if settings.archive_after_days > 0:
+            steps.append(("archived_emails", archive_emails, (now - timedelta(days=settings.archive_after_days),)))
+        if settings.draft_retention_days > 0:
+            steps.append(("pruned_drafts", prune_drafts, (now - timedelta(days=settings.draft_retention_days),)))
+        for name, step, args in steps:
+            start = time.perf_counter()
+            report[name] = step(db, *args)
+            report["timings"][name] = round(time.perf_counter() - start, 3)
+    finally:
+        db.close()
+
+    compact_database(report, convert)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+async def maintenance_job():
+    # The pass is blocking database work; keep it off the event loop
+    report = await asyncio.to_thread(run_maintenance)
+    print(f"Maintenance: {report}")
+    await events.publish("maintenance.completed", **report)
+
+
+if settings.maintenance_interval > 0:
+    register_job("maintenance", settings.maintenance_interval, maintenance_job)
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Running database maintenance...")
+    # Offline, so converting an old database with a full VACUUM is fine
+    for key, value in run_maintenance(convert=True).items():
+        print(f"  {key}: {value}")
+    print("\n✨ Maintenance complete!")
@@ -12,7 +12,9 @@ class EmailBase(BaseModel):
 
 
 class EmailCreate(EmailBase):
-    pass
+    message_id: Optional[str] = None
+    in_reply_to: Optional[str] = None
+    references: Optional[str] = None
 
 
 class EmailResponse(EmailBase):
@@ -24,6 +26,49 @@ class EmailResponse(EmailBase):
     has_action_items: bool
     action_items: Optional[str] = None
     sentiment: Optional[str] = None
+    message_id: Optional[str] = None
+    in_reply_to: Optional[str] = None
+    thread_id: Optional[int] = None
+    current_draft_id: Optional[int] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class EmailListItem(BaseModel):
+    """Email without its body, for list views"""
+    id: int
+    sender: str
+    sender_name: str
+    recipient: str
+    subject: str
+    snippet: Optional[str] = None
+    category: str
+    priority: str
+    received_at: datetime
+    is_read: bool
+    has_action_items: bool
+    action_items: Optional[str] = None
+    sentiment: Optional[str] = None
+    thread_id: Optional[int] = None
+    current_draft_id: Optional[int] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class SimilarEmail(BaseModel):
+    similarity: float
+    email: EmailListItem
+
+
+class ThreadResponse(BaseModel):
+    id: int
+    subject_key: str
+    summary: Optional[str] = None
+    message_count: int
+    last_message_at: datetime
+    created_at: datetime
     
     class Config:
         from_attributes = True
@@ -70,6 +115,8 @@ class DraftResponse(DraftBase):
     id: int
     created_at: datetime
     is_sent: bool
+    is_speculative: bool = False
+    version: Optional[int] = None
     
     class Config:
         from_attributes = True
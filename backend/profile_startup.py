@@ -0,0 +1,47 @@
+"""
+Script to profile backend cold start: how long importing main takes and
+which top-level packages account for it (uses python -X importtime)
+"""
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+TOP_N = 15
+
+
+def profile_startup():
+    env = dict(os.environ)
+    # Startup must not need LLM credentials
+    env.pop("GEMINI_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        return
+
+    # Lines look like "import time:  self [us] | cumulative | name"
+    self_times = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        self_times[package] += int(self_us)
+        if name.startswith(" main") or name.strip() == "main":
+            total = int(cumulative_us)
+
+    print(f"import main: {total / 1000:.1f} ms")
+    print(f"\nTop {TOP_N} packages by import time:")
+    for package, us in sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:TOP_N]:
+        print(f"  {package:30} {us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    profile_startup()
@@ -0,0 +1,51 @@
+"""
+Fast JSON path for high-volume list endpoints.
+
+Rows are projected straight from SQL into dicts (no ORM objects, no
+Pydantic validation) and encoded with orjson when it is installed.
+"""
+import json
+from datetime import date, datetime
+from typing import Dict, List, Type
+
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def projection(model, schema: Type[BaseModel]) -> List:
+    """Columns of a table model matching the fields of a response schema"""
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def fetch_dicts(db: Session, statement) -> List[Dict]:
+    return [dict(row) for row in db.execute(statement).mappings()]
+
+
+def select_for(model, schema: Type[BaseModel]):
+    return select(*projection(model, schema))
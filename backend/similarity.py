@@ -0,0 +1,230 @@
+"""
+Local similar-email lookup.
+
+Emails are embedded on CPU with signed feature hashing of word unigrams
+and bigrams (no model download), quantized to int8 and appended to a
+memory-mapped record file. A 16-bit random-hyperplane LSH signature per
+record gives approximate nearest-neighbour candidates, which are then
+re-ranked by exact dot product.
+
+The file is append-only: re-indexing an email appends a new record and
+the latest one wins, so workers can share the file and pick up each
+other's additions by re-mapping it when it grows. Deleting an email
+appends an all-zero tombstone record.
+"""
+import asyncio
+import hashlib
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from background import register_job
+from config import settings
+from database import SessionLocal, engine, Email, Draft
+from threads import strip_quoted_history, is_reply_subject
+
+DIM = 256
+SIGNATURE_BITS = 16
+RECORD = np.dtype([
+    ("email_id", "<i4"),
+    ("signature", "<u2"),
+    ("vector", "i1", (DIM,)),
+])
+# Below this many LSH candidates the whole index is scanned instead
+MIN_CANDIDATES = 64
+INDEX_BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+GREETING_RE = re.compile(r"^(\s*(?:hi|hello|dear|hey)\s+)([^,\n]+)(,)", re.IGNORECASE)
+
+# Fixed seed so every process computes the same signatures
+_planes = np.random.default_rng(20240101).standard_normal((SIGNATURE_BITS, DIM)).astype(np.float32)
+_bit_weights = (1 << np.arange(SIGNATURE_BITS)).astype(np.uint32)
+
+
+def embed(text: str) -> np.ndarray:
+    """L2-normalized float32 embedding of a text"""
+    tokens = TOKEN_RE.findall((text or "").lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector = np.zeros(DIM, dtype=np.float32)
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[h % DIM] += 1.0 if h >> 63 else -1.0
+    # Dampen repeated words so long emails aren't dominated by them
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def signature(vector: np.ndarray) -> int:
+    bits = (_planes @ vector) > 0
+    return int((bits * _bit_weights).sum())
+
+
+def email_text(email: Email) -> str:
+    return f"{email.subject or ''}\n{strip_quoted_history(email.body)}"
+
+
+class VectorIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.records = np.zeros(0, dtype=RECORD)
+        self.loaded = 0
+        self.rows: Dict[int, int] = {}  # email id -> latest row
+        self.buckets = defaultdict(list)  # signature -> rows
+        self.stale = np.zeros(0, dtype=bool)  # rows superseded by a later record or removed
+
+    def reset(self):
+        self.records = np.zeros(0, dtype=RECORD)
+        self.loaded = 0
+        self.rows.clear()
+        self.buckets.clear()
+        self.stale = np.zeros(0, dtype=bool)
+
+    def refresh(self):
+        """Map records appended since the last call, by this or another process"""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        # Ignore a record still being written by another process
+        complete = size // RECORD.itemsize
+        if complete < self.loaded:
+            self.reset()
+        if complete == self.loaded:
+            return
+        self.records = np.memmap(self.path, dtype=RECORD, mode="r", shape=(complete,))
+        self.stale = np.concatenate([self.stale, np.zeros(complete - self.loaded, dtype=bool)])
+        new = self.records[self.loaded:complete]
+        tombstones = (~new["vector"].any(axis=1)).tolist()
+        for offset, (email_id, sig) in enumerate(zip(new["email_id"].tolist(), new["signature"].tolist())):
+            row = self.loaded + offset
+            previous = self.rows.pop(email_id, None)
+            if previous is not None:
+                self.stale[previous] = True
+            if tombstones[offset]:
+                self.stale[row] = True
+                continue
+            self.rows[email_id] = row
+            self.buckets[sig].append(row)
+        self.loaded = complete
+
+    def add(self, email_id: int, vector: np.ndarray):
+        record = np.zeros(1, dtype=RECORD)
+        record["email_id"] = email_id
+        record["signature"] = signature(vector)
+        record["vector"] = np.clip(np.round(vector * 127), -127, 127).astype(np.int8)
+        # A single small append keeps records whole across processes
+        with open(self.path, "ab") as f:
+            f.write(record.tobytes())
+
+    def remove(self, email_id: int):
+        self.add(email_id, np.zeros(DIM, dtype=np.float32))
+
+    def search(self, vector: np.ndarray, k: int = 5, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return up to k (email_id, cosine similarity) pairs, best first"""
+        self.refresh()
+        if not self.rows:
+            return []
+
+        sig = signature(vector)
+        candidates = []
+        # Probe the query's bucket and every bucket one bit flip away
+        for probe in [sig] + [sig ^ (1 << bit) for bit in range(SIGNATURE_BITS)]:
+            candidates.extend(self.buckets.get(probe, ()))
+        if len(candidates) < max(MIN_CANDIDATES, k):
+            rows = np.flatnonzero(~self.stale)
+        else:
+            rows = np.array(candidates, dtype=np.int64)
+            rows = rows[~self.stale[rows]]
+
+        ids = self.records["email_id"][rows]
+        if exclude is not None:
+            keep = ids != exclude
+            rows, ids = rows[keep], ids[keep]
+        if len(rows) == 0:
+            return []
+
+        scores = self.records["vector"][rows].astype(np.float32) @ vector / 127
+        top = np.argsort(-scores)[:k]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+email_index = VectorIndex(settings.vector_index_path)
+
+
+def index_email(email: Email):
+    """Embed an email and append it to the index (email must have an id)"""
+    email_index.add(email.id, embed(email_text(email)))
+    email.is_indexed = True
+
+
+def unindex_email(email_id: int):
+    """Drop a deleted or archived email from similarity results"""
+    email_index.remove(email_id)
+
+
+def find_similar(email: Email, k: int = 5) -> List[Tuple[int, float]]:
+    return email_index.search(embed(email_text(email)), k=k, exclude=email.id)
+
+
+def adapt_greeting(body: str, sender_name: Optional[str]) -> str:
+    """Swap the addressee in a reused reply's greeting line"""
+    first_name = (sender_name or "").split(" ")[0]
+    if not first_name:
+        return body
+    return GREETING_RE.sub(lambda m: f"{m.group(1)}{first_name}{m.group(3)}", body, count=1)
+
+
+def reuse_similar_draft(db: Session, email: Email) -> Optional[Dict]:
+    """Reuse the current draft of a near-identical email, if there is one"""
+    if settings.draft_reuse_threshold > 1:
+        return None
+    for similar_id, score in find_similar(email, k=5):
+        if score < settings.draft_reuse_threshold:
+            break
+        draft = db.query(Draft).join(Email, Email.current_draft_id == Draft.id).filter(
+            Email.id == similar_id
+        ).first()
+        if draft:
+            return {
+                "subject": email.subject if is_reply_subject(email.subject) else f"Re: {email.subject}",
+                "body": adapt_greeting(draft.body, email.sender_name),
+                "key_points": [],
+                "reused_from_email_id": similar_id,
+                "similarity": round(score, 3)
+            }
+    return None
+
+
+def _index_batch() -> int:
+    """Index up to INDEX_BATCH_SIZE unindexed emails; returns how many"""
+    db = SessionLocal()
+    try:
+        emails = db.query(Email).filter(
+            (Email.is_indexed == False) | (Email.is_indexed.is_(None))
+        ).limit(INDEX_BATCH_SIZE).all()
+        for email in emails:
+            index_email(email)
+        db.commit()
+        return len(emails)
+    finally:
+        db.close()
+
+
+async def index_pending_emails():
+    """Backfill embeddings for emails not yet in the index"""
+    if not os.path.exists(email_index.path):
+        # Index file was removed; everything needs re-indexing
+        with engine.begin() as conn:
+            conn.execute(update(Email).where(Email.is_indexed == True).values(is_indexed=False))
+        email_index.reset()
+    # Decompressing and embedding is CPU work; run each batch in a thread
+    # so requests keep being served during a large backfill
+    while await asyncio.to_thread(_index_batch):
+        pass
+
+
+register_job("index_emails", 60, index_pending_emails)
@@ -0,0 +1,77 @@
+"""
+Offline tests for model routing, using LocalProvider stand-ins.
+
+    cd backend
+    python -m unittest test_llm_providers
+"""
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from config import settings
+from llm_providers import AllModelsFailed, LocalProvider, ModelRouter, build_router
+
+
+def make_router(latency_slo=None, **providers):
+    return ModelRouter(providers, {"categorize": list(providers), "chat": list(providers)}, latency_slo)
+
+
+class ModelRouterTest(unittest.TestCase):
+    def test_first_model_answers(self):
+        router = make_router(primary=LocalProvider("primary"), backup=LocalProvider("backup"))
+        result = json.loads(asyncio.run(router.generate("categorize", "Subject: x\nBody: urgent, please reply")))
+        self.assertEqual(result["priority"], "High")
+        self.assertEqual(router.stats["primary"].calls, 1)
+        self.assertEqual(router.stats["backup"].calls, 0)
+
+    def test_fails_over_to_next_model(self):
+        router = make_router(primary=LocalProvider("primary", fail=True), backup=LocalProvider("backup"))
+        asyncio.run(router.generate("categorize", "Body: hello"))
+        self.assertEqual(router.stats["primary"].failures, 1)
+        self.assertEqual(router.stats["backup"].calls, 1)
+        self.assertEqual(router.stats["backup"].failures, 0)
+
+    def test_slow_model_times_out_and_input_is_counted(self):
+        router = make_router(
+            latency_slo=0.05,
+            primary=LocalProvider("primary", latency=1.0),
+            backup=LocalProvider("backup")
+        )
+        asyncio.run(router.generate("categorize", "Body: hello"))
+        primary = router.stats["primary"]
+        self.assertEqual(primary.timeouts, 1)
+        self.assertGreater(primary.input_tokens, 0)
+        self.assertEqual(primary.output_tokens, 0)
+        self.assertEqual(router.stats["backup"].calls, 1)
+
+    def test_all_models_failing_raises(self):
+        router = make_router(primary=LocalProvider("primary", fail=True), backup=LocalProvider("backup", fail=True))
+        with self.assertRaises(AllModelsFailed):
+            asyncio.run(router.generate("categorize", "Body: hello"))
+
+    def test_unrouted_task_uses_chat_chain(self):
+        router = make_router(primary=LocalProvider("primary"))
+        asyncio.run(router.generate("draft", "Subject: Hi\nBody: hello"))
+        self.assertEqual(router.stats["primary"].calls, 1)
+
+
+class BuildRouterTest(unittest.TestCase):
+    def routes(self, **overrides):
+        overrides = {"llm_provider": "gemini", "llm_fallback_model": None, **overrides}
+        with mock.patch.multiple(settings, **overrides):
+            return build_router().routes
+
+    def test_fast_model_defaults_to_main_model(self):
+        routes = self.routes(gemini_model="gemini-2.5-flash", gemini_fast_model=None)
+        self.assertEqual(routes["categorize"], ["gemini:gemini-2.5-flash"])
+        self.assertEqual(routes["draft"], ["gemini:gemini-2.5-flash"])
+
+    def test_fast_model_serves_light_tasks(self):
+        routes = self.routes(gemini_model="gemini-2.5-flash", gemini_fast_model="gemini-1.5-flash-8b")
+        self.assertEqual(routes["summarize"], ["gemini:gemini-1.5-flash-8b", "gemini:gemini-2.5-flash"])
+        self.assertEqual(routes["chat"], ["gemini:gemini-2.5-flash", "gemini:gemini-1.5-flash-8b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
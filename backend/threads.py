@@ -0,0 +1,176 @@
+"""
+Conversation threading: groups emails into threads and keeps a rolling
+per-thread summary so draft replies don't re-read the whole history.
+"""
+import re
+from datetime import datetime, timedelta
+from email.utils import getaddresses
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from database import Email, Thread
+
+# Reply/forward prefixes, possibly repeated ("Re: Fwd: RE[2]: ...")
+SUBJECT_PREFIX_RE = re.compile(r"^\s*((re|fw|fwd|aw|sv|wg)(\[\d+\])?\s*:\s*)+", re.IGNORECASE)
+
+# A subject-only match must be this recent and is looked for among this
+# many threads with the same subject
+SUBJECT_MATCH_WINDOW = timedelta(days=30)
+SUBJECT_MATCH_CANDIDATES = 5
+
+# Messages folded into a thread summary per LLM call
+SUMMARY_BATCH = 20
+
+# Start of quoted history in a reply body
+QUOTE_HEADER_RE = re.compile(
+    r"^(On .+ wrote:|-+\s*Original Message\s*-+|From: .+)$", re.IGNORECASE | re.MULTILINE
+)
+
+
+def normalize_subject(subject: Optional[str]) -> str:
+    """Strip reply/forward prefixes and collapse whitespace"""
+    subject = SUBJECT_PREFIX_RE.sub("", subject or "")
+    return " ".join(subject.split()).lower()
+
+
+def is_reply_subject(subject: Optional[str]) -> bool:
+    return bool(SUBJECT_PREFIX_RE.match(subject or ""))
+
+
+def strip_quoted_history(body: Optional[str]) -> str:
+    """Return only the new part of a reply, dropping quoted earlier messages"""
+    body = body or ""
+    match = QUOTE_HEADER_RE.search(body)
+    if match:
+        body = body[:match.start()]
+    lines = [line for line in body.splitlines() if not line.lstrip().startswith(">")]
+    return "\n".join(lines).strip()
+
+
+def _referenced_ids(email: Email) -> List[str]:
+    ids = []
+    if email.in_reply_to:
+        ids.append(email.in_reply_to.strip())
+    if email.references:
+        ids.extend(email.references.split())
+    return [i for i in ids if i]
+
+
+def _addresses(*values: Optional[str]) -> Set[str]:
+    return {address.lower() for _, address in getaddresses([v for v in values if v]) if address}
+
+
+def _participants(db: Session, thread: Thread) -> Set[str]:
+    """Addresses that sent or received a message in the thread"""
+    participants = set()
+    for sender, recipient in db.query(Email.sender, Email.recipient).filter(Email.thread_id == thread.id):
+        participants |= _addresses(sender, recipient)
+    return participants
+
+
+def find_thread(db: Session, email: Email) -> Optional[Thread]:
+    """Find the existing thread an email belongs to, if any.
+
+    Message-ID headers are preferred; the normalized subject is only used
+    as a fallback for replies/forwards without usable headers, and only
+    for a recent thread that both the sender and the recipient already
+    took part in, so unrelated "Re: Quick question" emails aren't merged.
+    """
+    referenced = _referenced_ids(email)
+    if referenced:
+        parent = db.query(Email).filter(
+            Email.message_id.in_(referenced),
+            Email.thread_id.isnot(None),
+            Email.id != email.id
+        ).order_by(Email.id.desc()).first()
+        if parent:
+            return db.query(Thread).filter(Thread.id == parent.thread_id).first()
+
+    sender = _addresses(email.sender)
+    recipients = _addresses(email.recipient)
+    if is_reply_subject(email.subject) and sender:
+        received_at = email.received_at or datetime.utcnow()
+        candidates = db.query(Thread).filter(
+            Thread.subject_key == normalize_subject(email.subject),
+            Thread.last_message_at >= received_at - SUBJECT_MATCH_WINDOW
+        ).order_by(Thread.last_message_at.desc()).limit(SUBJECT_MATCH_CANDIDATES)
+        for thread in candidates:
+            participants = _participants(db, thread)
+            # The mailbox owner is in every thread, so both sides must match
+            if sender & participants and (not recipients or recipients & participants):
+                return thread
+
+    return None
+
+
+def refresh_thread_counts(db: Session, thread_ids: Iterable[Optional[int]]):
+    """Recount messages after emails were deleted; empty threads are removed"""
+    db.flush()
+    for thread_id in set(thread_ids) - {None}:
+        thread = db.query(Thread).filter(Thread.id == thread_id).first()
+        if thread is None:
+            continue
+        count = db.query(Email).filter(Email.thread_id == thread_id).count()
+        if count:
+            thread.message_count = count
+        else:
+            db.delete(thread)
+
+
+def assign_thread(db: Session, email: Email) -> Thread:
+    """Attach an email to its thread, creating a new thread if needed"""
+    if email.thread_id is not None:
+        thread = db.query(Thread).filter(Thread.id == email.thread_id).first()
+        if thread:
+            return thread
+
+    thread = find_thread(db, email)
+    if not thread:
+        thread = Thread(
+            subject_key=normalize_subject(email.subject),
+            summarized_through_id=0,
+            message_count=0,
+            last_message_at=email.received_at or datetime.utcnow()
+        )
+        db.add(thread)
+        db.flush()
+
+    email.thread_id = thread.id
+    thread.message_count = (thread.message_count or 0) + 1
+    received_at = email.received_at or datetime.utcnow()
+    if not thread.last_message_at or received_at > thread.last_message_at:
+        thread.last_message_at = received_at
+    return thread
+
+
+async def update_thread_summary(db: Session, thread: Thread, llm, before_email_id: Optional[int] = None) -> Optional[str]:
+    """Fold messages not yet summarized into the thread's rolling summary.
+
+    Pending messages are folded in batches of SUMMARY_BATCH per LLM call,
+    and each is summarized exactly once. Messages at or after
+    before_email_id are left out so the email being replied to is not
+    folded into its own context. If the stored summary already covers
+    such messages (a reply to an older email) None is returned, so later
+    messages never leak into the reply.
+    """
+    if before_email_id is not None and (thread.summarized_through_id or 0) >= before_email_id:
+        return None
+
+    query = db.query(Email).filter(
+        Email.thread_id == thread.id,
+        Email.id > (thread.summarized_through_id or 0)
+    )
+    if before_email_id is not None:
+        query = query.filter(Email.id < before_email_id)
+
+    pending = query.order_by(Email.id).all()
+    for i in range(0, len(pending), SUMMARY_BATCH):
+        batch = pending[i:i + SUMMARY_BATCH]
+        thread.summary = await llm.summarize_thread(thread.summary, [
+            (message.sender_name or message.sender, message.subject, strip_quoted_history(message.body))
+            for message in batch
+        ])
+        thread.summarized_through_id = batch[-1].id
+
+    return thread.summary
@@ -1,10 +1,10 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import './App.css';
 import EmailList from './components/EmailList';
 import EmailDetail from './components/EmailDetail';
 import PromptEditor from './components/PromptEditor';
 import ChatInterface from './components/ChatInterface';
-import { emailAPI, statsAPI } from './api';
+import { emailAPI, statsAPI, subscribeEvents } from './api';
 
 function App() {
   const [currentView, setCurrentView] = useState('inbox');
@@ -19,9 +19,23 @@ function App() {
     loadStats();
   }, [selectedCategory]);
 
-  const loadEmails = async () => {
+  // Keep the latest loaders for the event handler without reconnecting
+  const refreshRef = useRef(null);
+  refreshRef.current = () => {
+    loadEmails(false);
+    loadStats();
+  };
+
+  useEffect(() => {
+    return subscribeEvents((event) => {
+      if (event.type === 'job.progress') return;
+      refreshRef.current();
+    });
+  }, []);
+
+  const loadEmails = async (showLoading = true) => {
     try {
-      setLoading(true);
+      if (showLoading) setLoading(true);
       const response = await emailAPI.getAll(selectedCategory);
       setEmails(response.data);
     } catch (error) {
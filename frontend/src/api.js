@@ -32,8 +32,9 @@ export const promptAPI = {
 
 // Draft API
 export const draftAPI = {
-  getAll: (emailId = null) => {
-    const params = emailId ? { email_id: emailId } : {};
+  // Newest first
+  getAll: (emailId = null, params = {}) => {
+    if (emailId) params = { ...params, email_id: emailId };
     return api.get('/api/drafts', { params });
   },
   getById: (id) => api.get(`/api/drafts/${id}`),
@@ -49,4 +50,35 @@ export const statsAPI = {
   get: () => api.get('/api/stats'),
 };
 
+// Event stream (email.created, email.updated, email.processed, draft.created, job.progress)
+export const subscribeEvents = (onEvent) => {
+  const wsUrl = API_BASE_URL.replace(/^http/, 'ws') + '/api/events';
+  let socket = null;
+  let closed = false;
+  let retryDelay = 1000;
+
+  const connect = () => {
+    socket = new WebSocket(wsUrl);
+    socket.onopen = () => { retryDelay = 1000; };
+    socket.onmessage = (message) => {
+      try {
+        onEvent(JSON.parse(message.data));
+      } catch (error) {
+        console.error('Error handling event:', error);
+      }
+    };
+    socket.onclose = () => {
+      if (closed) return;
+      setTimeout(connect, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    if (socket) socket.close();
+  };
+};
+
 export default api;
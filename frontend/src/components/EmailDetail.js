@@ -8,13 +8,26 @@ function EmailDetail({ email, onClose, onProcessComplete }) {
   const [showDraft, setShowDraft] = useState(false);
 
   useEffect(() => {
+    loadEmail();
     loadDrafts();
   }, [email.id]);
 
+  // The inbox list only carries a snippet, so fetch the full body here
+  const loadEmail = async () => {
+    try {
+      const response = await emailAPI.getById(email.id);
+      setProcessedEmail(response.data);
+    } catch (error) {
+      console.error('Error loading email:', error);
+    }
+  };
+
   const loadDrafts = async () => {
     try {
       const response = await draftAPI.getAll(email.id);
       setDrafts(response.data);
+      // Drafts may have been pre-generated in the background
+      if (response.data.length > 0) setShowDraft(true);
     } catch (error) {
       console.error('Error loading drafts:', error);
     }
@@ -75,7 +88,7 @@ function EmailDetail({ email, onClose, onProcessComplete }) {
           </div>
 
           <div className="email-detail-body">
-            {processedEmail.body}
+            {processedEmail.body ?? processedEmail.snippet}
           </div>
 
           {processedEmail.has_action_items && parseActionItems().length > 0 && (
@@ -117,12 +130,17 @@ function EmailDetail({ email, onClose, onProcessComplete }) {
 
           {showDraft && drafts.length > 0 && (
             <div style={{marginTop: '30px', padding: '20px', backgroundColor: '#e8f5e9', borderRadius: '8px'}}>
-              <h4 style={{marginBottom: '15px', color: '#2e7d32'}}>📝 Draft Reply</h4>
+              <h4 style={{marginBottom: '15px', color: '#2e7d32'}}>
+                📝 Draft Reply
+                {drafts[0].is_speculative && (
+                  <span className="badge" style={{marginLeft: '10px'}}>Pre-generated</span>
+                )}
+              </h4>
               <div style={{marginBottom: '10px'}}>
-                <strong>Subject:</strong> {drafts[drafts.length - 1].subject}
+                <strong>Subject:</strong> {drafts[0].subject}
               </div>
               <div style={{backgroundColor: 'white', padding: '15px', borderRadius: '5px', whiteSpace: 'pre-wrap'}}>
-                {drafts[drafts.length - 1].body}
+                {drafts[0].body}
               </div>
             </div>
           )}
@@ -25,6 +25,7 @@ function EmailList({ emails, onEmailClick }) {
   };
 
   const truncateText = (text, maxLength = 100) => {
+    if (!text) return '';
     if (text.length <= maxLength) return text;
     return text.substr(0, maxLength) + '...';
   };
@@ -42,7 +43,7 @@ function EmailList({ emails, onEmailClick }) {
             <span className="email-time">{formatDate(email.received_at)}</span>
           </div>
           <div className="email-subject">{email.subject}</div>
-          <div className="email-preview">{truncateText(email.body)}</div>
+          <div className="email-preview">{truncateText(email.snippet)}</div>
           <div className="email-meta">
             <span className="badge badge-category">{email.category}</span>
             <span className={`badge badge-priority ${email.priority.toLowerCase()}`}>